@@ -8,9 +8,11 @@ Tool for orchestrating documentation builds using Sphinx.
 __requires__ = [
     'coherent.build',
     'pip-run',
+    'platformdirs',
     'sphinx >= 3.5',
     'jaraco.packaging >= 9.3',
     'rst.linker >= 1.9',
     'furo',
     'sphinx-lint',
+    'watchfiles',
 ]
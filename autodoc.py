@@ -0,0 +1,254 @@
+"""
+Attribute the cost of autodoc to each documented module.
+
+A Sphinx extension recording, for each ``automodule`` directive, the
+time spent importing the module, the number of members documented and
+the time spent generating its content, plus the time spent rendering
+the page holding it, then saving the modules, slowest first, to
+``coherent_docs_autodoc_report``.
+
+Imports and members are recorded in the build environment, so they
+survive incremental builds and are merged from parallel reads. Render
+times are only recorded for pages written in this process (so are
+complete only for serial builds).
+
+The modules in ``coherent_docs_mock_imports`` are added to those autodoc
+mocks (``autodoc_mock_imports``), whether or not ``conf.py`` is
+generated.
+"""
+
+import contextlib
+import functools
+import importlib
+import json
+import pathlib
+import time
+
+
+class ModuleCosts:
+    """
+    Costs of the automodule directive being run.
+    """
+
+    current: 'ModuleCosts | None' = None
+
+    def __init__(self, module: str):
+        self.module = module
+        self.imports = 0.0
+        self.members = 0
+
+    def record(self, generate: float) -> dict:
+        return dict(
+            imports=self.imports,
+            members=self.members,
+            generate=generate - self.imports,
+        )
+
+
+def rank(recorded: dict, rendered: dict) -> list[dict]:
+    """
+    Combine the costs recorded per document and module with the render
+    time of each document, slowest module first.
+
+    >>> recorded = {
+    ...     'my.pkg': {'my.pkg': dict(imports=0.1, members=2, generate=0.1)},
+    ...     'my.pkg.slow': {
+    ...         'my.pkg.slow': dict(imports=2.0, members=40, generate=0.5),
+    ...     },
+    ... }
+    >>> [row['module'] for row in rank(recorded, {'my.pkg': 0.1})]
+    ['my.pkg.slow', 'my.pkg']
+    >>> rank(recorded, {})[0]['total']
+    2.5
+    """
+    rows = [
+        dict(
+            module=module,
+            docname=docname,
+            **costs,
+            render=rendered.get(docname),
+            total=costs['imports'] + costs['generate'] + rendered.get(docname, 0.0),
+        )
+        for docname, modules in recorded.items()
+        for module, costs in modules.items()
+    ]
+    return sorted(rows, key=lambda row: row['total'], reverse=True)
+
+
+def summary(report: list[dict], count: int = 5) -> str:
+    """
+    Summarize the slowest modules in a report.
+
+    >>> report = [dict(module='my.pkg.slow', total=2.5, imports=2.0, members=40)]
+    >>> summary(report)
+    'my.pkg.slow 2.50s (import 2.00s, 40 members)'
+    """
+    return ', '.join(
+        f'{row["module"]} {row["total"]:.2f}s '
+        f'(import {row["imports"]:.2f}s, {row["members"]} members)'
+        for row in report[:count]
+    )
+
+
+def load(path: pathlib.Path) -> list[dict]:
+    with contextlib.suppress(OSError, ValueError):
+        return json.loads(path.read_text(encoding='utf-8'))
+    return []
+
+
+def _timed_import(import_module):
+    @functools.wraps(import_module)
+    def wrapper(*args, **kwargs):
+        began = time.perf_counter()
+        try:
+            return import_module(*args, **kwargs)
+        finally:
+            if ModuleCosts.current:
+                ModuleCosts.current.imports += time.perf_counter() - began
+
+    wrapper.timed = True
+    return wrapper
+
+
+def _timed_run(run):
+    @functools.wraps(run)
+    def wrapper(self):
+        if ModuleCosts.current:
+            return run(self)
+        costs = ModuleCosts.current = ModuleCosts(self.arguments[0])
+        began = time.perf_counter()
+        try:
+            return run(self)
+        finally:
+            ModuleCosts.current = None
+            env = self.state.document.settings.env
+            recorded = _recorded(env).setdefault(env.docname, {})
+            recorded[costs.module] = costs.record(time.perf_counter() - began)
+
+    wrapper.timed = True
+    return wrapper
+
+
+def _timed_write(write_doc):
+    @functools.wraps(write_doc)
+    def wrapper(self, docname, doctree):
+        began = time.perf_counter()
+        try:
+            return write_doc(self, docname, doctree)
+        finally:
+            rendered = getattr(self, 'coherent_docs_rendered', None)
+            if rendered is not None:
+                rendered[docname] = time.perf_counter() - began
+
+    wrapper.timed = True
+    return wrapper
+
+
+def _timed_directive(cls):
+    namespace = dict(run=_timed_run(cls.run), __module__=cls.__module__)
+    return type(cls.__name__, (cls,), namespace)
+
+
+def _recorded(env) -> dict:
+    if not hasattr(env, 'coherent_docs_autodoc'):
+        env.coherent_docs_autodoc = {}
+    return env.coherent_docs_autodoc
+
+
+def _on_docstring(app, what, name, obj, options, lines):
+    if ModuleCosts.current and name != ModuleCosts.current.module:
+        ModuleCosts.current.members += 1
+
+
+def _on_config_inited(app, config):
+    if 'sphinx.ext.autodoc' in app.extensions:
+        app.connect('autodoc-process-docstring', _on_docstring)
+        mocks = config.coherent_docs_mock_imports
+        config.autodoc_mock_imports = [*config.autodoc_mock_imports, *mocks]
+
+
+def _on_builder_inited(app):
+    from docutils.parsers.rst import directives
+
+    app.builder.coherent_docs_rendered = {}
+    if 'sphinx.ext.autodoc' not in app.extensions:
+        return
+    # Sphinx 9 registers autodoc's directives when the config is inited,
+    # so look up whichever class is registered once they are
+    cls, _ = directives.directive('automodule', None, None)
+    app.add_directive('automodule', _timed_directive(cls), override=True)
+
+
+def _on_purge_doc(app, env, docname):
+    _recorded(env).pop(docname, None)
+
+
+def _on_merge_info(app, env, docnames, other):
+    recorded = _recorded(other)
+    _recorded(env).update(
+        (docname, recorded[docname]) for docname in docnames if docname in recorded
+    )
+
+
+def _on_build_finished(app, exception):
+    path = app.config.coherent_docs_autodoc_report
+    if not path or exception:
+        return
+    report = rank(_recorded(app.env), app.builder.coherent_docs_rendered)
+    target = pathlib.Path(path)
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_text(json.dumps(report, indent=2), encoding='utf-8')
+
+
+def setup(app):
+    """
+    Record the autodoc costs of a build.
+
+    >>> import sys, tempfile
+    >>> from sphinx.application import Sphinx
+    >>> from sphinx.util.docutils import docutils_namespace
+    >>> tmp = tempfile.TemporaryDirectory()
+    >>> root = pathlib.Path(tmp.name)
+    >>> _ = root.joinpath('demo_mod.py').write_text('def f():\\n    "F."\\n')
+    >>> docs = root / 'docs'
+    >>> docs.mkdir()
+    >>> extensions = ['sphinx.ext.autodoc', 'coherent.docs.autodoc']
+    >>> _ = docs.joinpath('conf.py').write_text(f'extensions = {extensions!r}\\n')
+    >>> index = '.. automodule:: demo_mod\\n   :members:\\n'
+    >>> _ = docs.joinpath('index.rst').write_text(index)
+    >>> report = root / 'autodoc.json'
+    >>> overrides = dict(coherent_docs_autodoc_report=str(report))
+    >>> sys.path.insert(0, tmp.name)
+    >>> with docutils_namespace():
+    ...     app = Sphinx(
+    ...         docs, docs, root / 'html', root / 'doctrees', 'html',
+    ...         confoverrides=overrides, status=None, warning=None,
+    ...     )
+    ...     app.build()
+    >>> [(row['module'], row['members']) for row in load(report)]
+    [('demo_mod', 1)]
+    >>> row = load(report)[0]
+    >>> row['imports'] > 0, row['render'] > 0
+    (True, True)
+    >>> sys.path.remove(tmp.name)
+    >>> tmp.cleanup()
+    """
+    from sphinx.builders.html import StandaloneHTMLBuilder
+
+    # autodoc imports modules through importlib.import_module, however
+    # its own importer is laid out
+    patches = [
+        (importlib, 'import_module', _timed_import),
+        (StandaloneHTMLBuilder, 'write_doc', _timed_write),
+    ]
+    for owner, name, patch in patches:
+        if not getattr(getattr(owner, name), 'timed', False):
+            setattr(owner, name, patch(getattr(owner, name)))
+    app.add_config_value('coherent_docs_autodoc_report', '', '')
+    app.add_config_value('coherent_docs_mock_imports', [], '')
+    app.connect('config-inited', _on_config_inited)
+    app.connect('builder-inited', _on_builder_inited)
+    app.connect('env-purge-doc', _on_purge_doc)
+    app.connect('env-merge-info', _on_merge_info)
+    app.connect('build-finished', _on_build_finished)
+    return dict(parallel_read_safe=True, parallel_write_safe=True)
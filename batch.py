@@ -0,0 +1,139 @@
+"""
+Build the docs for many projects concurrently.
+
+Projects with the same doc dependencies share an environment, provisioned
+once. Run with ``python -m coherent.docs.batch ROOT [ROOT ...]``.
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import contextlib
+import os
+import pathlib
+import time
+import traceback
+
+from coherent.build import bootstrap, discovery
+
+from . import core, envs
+
+LOG = pathlib.Path('build/docs.log')
+
+
+def provision(root: pathlib.Path, options):
+    """
+    Provision the dependency environment for the project at root, shared
+    by every project with the same dependencies (or lockfile), returning
+    a context holding it in use.
+    """
+    static = core.is_static(options, root)
+    lock = None if static else envs.locked(root)
+    return envs.load(
+        *([] if lock else envs.requirements(root, static=static)),
+        key=envs.dependencies_key(root, static=static),
+        refresh=options.refresh_env,
+        installer=options.installer,
+        wheelhouse=options.wheelhouse if options.offline else None,
+        lock=lock,
+    )
+
+
+@contextlib.contextmanager
+def redirected(path: pathlib.Path):
+    """
+    Redirect this process's stdout and stderr (including subprocesses)
+    to path.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    saved = os.dup(1), os.dup(2)
+    with path.open('w', encoding='utf-8') as log:
+        os.dup2(log.fileno(), 1)
+        os.dup2(log.fileno(), 2)
+        try:
+            yield
+        finally:
+            os.dup2(saved[0], 1)
+            os.dup2(saved[1], 2)
+            list(map(os.close, saved))
+
+
+def build(root: pathlib.Path, home: pathlib.Path, options) -> tuple[str, int, float]:
+    """
+    Build the project at root (in a worker process), logging to
+    ``build/docs.log``. Return its name, status and duration.
+    """
+    start = time.perf_counter()
+    os.chdir(root)
+    name = root.name
+    with redirected(LOG):
+        try:
+            name = discovery.best_name()
+            envs.overlay(name, core.OVERLAY, version=core.project_version())
+            docs = core.configure_docs(name, static=core.is_static(options))
+            with bootstrap.write_pyproject(), docs:
+                code = core.build(home, options)
+        except Exception:
+            traceback.print_exc()
+            code = 1
+    return name, code, time.perf_counter() - start
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        prog='coherent.docs.batch', description='Build the docs for many projects.'
+    )
+    parser.add_argument('roots', nargs='+', type=pathlib.Path)
+    parser.add_argument(
+        '-w',
+        '--workers',
+        type=int,
+        help='Number of concurrent builds (default: one per CPU).',
+    )
+    core.add_build_arguments(parser)
+    parser.set_defaults(jobs=None, in_process=False, profile=None, mocked=[])
+    options = parser.parse_args(args)
+    options.roots = [root.resolve() for root in options.roots]
+    options.workers = options.workers or min(len(options.roots), core.available_cpus())
+    options.jobs = options.jobs or max(core.jobs('auto') // options.workers, 1)
+    return options
+
+
+def main(args=None):
+    options = parse_args(args)
+    groups = collections.defaultdict(list)
+    results = {}
+    for root in options.roots:
+        try:
+            key = envs.dependencies_key(root, static=core.is_static(options, root))
+        except Exception:
+            traceback.print_exc()
+            results[root] = (root.name, 1, 0.0)
+            continue
+        groups[key].append(root)
+    with (
+        contextlib.ExitStack() as in_use,
+        concurrent.futures.ProcessPoolExecutor(options.workers) as pool,
+    ):
+        futures = {}
+        for group in groups.values():
+            try:
+                home = in_use.enter_context(provision(group[0], options))
+            except Exception:
+                traceback.print_exc()
+                results.update({root: (root.name, 1, 0.0) for root in group})
+                continue
+            for root in group:
+                futures[pool.submit(build, root, home, options)] = root
+        for future in concurrent.futures.as_completed(futures):
+            results[futures[future]] = future.result()
+    for root in options.roots:
+        name, code, duration = results[root]
+        status = 'ok' if code == 0 else f'failed ({code}), see {root / LOG}'
+        print(f'{name:<40} {duration:7.1f}s  {status}')
+    failed = sum(1 for _, code, _ in results.values() if code)
+    print(f'{len(results) - failed} built, {failed} failed')
+    raise SystemExit(int(bool(failed)))
+
+
+__name__ == '__main__' and main()
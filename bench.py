@@ -0,0 +1,328 @@
+"""
+Benchmarks for the documentation pipeline.
+
+Run with ``python -m coherent.docs.bench`` to time module discovery, or
+``python -m coherent.docs.bench scale`` to measure each stage of a build
+on a synthetic package of a given size.
+"""
+
+import argparse
+import contextlib
+import functools
+import json
+import os
+import pathlib
+import re
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+import tracemalloc
+
+from . import core, envs
+
+
+def make_members(members: int) -> str:
+    """
+    Generate source for a module with ``members`` documented functions
+    and classes.
+
+    >>> source = make_members(3)
+    >>> source.count('def func'), source.count('class Class')
+    (2, 1)
+    """
+    return ''.join(
+        f'class Class{index}:\n    """Class {index}."""\n\n'
+        f'    def method(self, arg):\n        """Method of Class {index}."""\n\n\n'
+        if index % 2
+        else f'def func{index}(arg, option=None):\n    """Function {index}."""\n\n\n'
+        for index in range(members)
+    )
+
+
+def is_private(index: int, ratio: float) -> bool:
+    """
+    Spread private modules evenly at the given ratio.
+
+    >>> [is_private(index, 0.25) for index in range(8)]
+    [False, False, False, True, False, False, False, True]
+    """
+    return int((index + 1) * ratio) > int(index * ratio)
+
+
+def positive(value: str) -> int:
+    """
+    Parse a positive integer argument.
+
+    >>> positive('3')
+    3
+    >>> positive('0')
+    Traceback (most recent call last):
+    ...
+    argparse.ArgumentTypeError: expected a positive integer, got 0
+    """
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f'expected a positive integer, got {value}')
+    return number
+
+
+def make_package(
+    root: pathlib.Path,
+    modules: int,
+    depth: int = 1,
+    members: int = 0,
+    private: float = 0.0,
+) -> None:
+    """
+    Lay out an essential-layout package at root with ``modules`` modules
+    spread across subpackages nested up to ``depth`` levels, each with
+    ``members`` members, a ``private`` fraction of them private.
+    """
+    if depth < 1:
+        raise ValueError(f'depth must be at least 1, got {depth}')
+    root.joinpath('__init__.py').write_text('', encoding='utf-8')
+    source = make_members(members)
+    for index in range(modules):
+        package = root.joinpath(*(f'sub{level}' for level in range(index % depth)))
+        if not package.joinpath('__init__.py').exists():
+            package.mkdir(parents=True, exist_ok=True)
+            package.joinpath('__init__.py').write_text('', encoding='utf-8')
+        name = f'_mod{index}' if is_private(index, private) else f'mod{index}'
+        package.joinpath(f'{name}.py').write_text(source, encoding='utf-8')
+
+
+def make_venv(root: pathlib.Path, files: int, per_package: int = 50) -> None:
+    """
+    Lay out a virtualenv under ``root/.venv`` holding ``files`` modules.
+    """
+    venv = root / '.venv'
+    site = venv / 'lib' / 'python3' / 'site-packages'
+    venv.mkdir()
+    venv.joinpath('pyvenv.cfg').write_text('', encoding='utf-8')
+    for index in range(files):
+        package = site / f'dist{index // per_package}'
+        package.mkdir(parents=True, exist_ok=True)
+        package.joinpath(f'mod{index}.py').write_text('', encoding='utf-8')
+
+
+def find_modules_unpruned(package_name: str, root: pathlib.Path) -> list[str]:
+    """
+    Discovery as previously implemented, walking the whole tree.
+    """
+
+    def to_module(path):
+        parts = path.relative_to(root).with_suffix('').parts
+        if parts[-1] == '__init__':
+            parts = parts[:-1]
+        return '.'.join((package_name,) + parts) if parts else package_name
+
+    return sorted(
+        filter(lambda m: not re.search(r'\._', m), map(to_module, root.rglob('*.py'))),
+        key=lambda m: (m.count('.'), m),
+    )
+
+
+def uncached(root: pathlib.Path):
+    """
+    Return a function clearing the discovery cache under root, so each
+    run of discovery is cold.
+    """
+    return lambda: root.joinpath(core.DISCOVERY).unlink(missing_ok=True)
+
+
+def bench_discovery(modules: int, venv_files: int, repeat: int) -> dict[str, float]:
+    """
+    Time module discovery on a package alongside a large ``.venv``,
+    reporting the best of ``repeat`` runs in seconds, cold (without the
+    discovery cache) and warm.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        root = pathlib.Path(tmp)
+        make_package(root, modules)
+        make_venv(root, venv_files)
+        candidates = dict(
+            find_modules=(core.find_modules, uncached(root)),
+            find_modules_warm=(core.find_modules, lambda: None),
+            unpruned=(find_modules_unpruned, lambda: None),
+        )
+        return {
+            name: min(
+                timeit.repeat(
+                    lambda: func('pkg', root), setup=setup, number=1, repeat=repeat
+                )
+            )
+            for name, (func, setup) in candidates.items()
+        }
+
+
+@contextlib.contextmanager
+def working_dir(path: pathlib.Path):
+    orig = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(orig)
+
+
+def measure(func, repeat: int, setup=lambda: None) -> dict[str, float]:
+    """
+    Time func, reporting the best of ``repeat`` runs in seconds, and the
+    peak memory in bytes allocated by one further (traced) run. Each run
+    is preceded by (untimed) ``setup``.
+    """
+    seconds = min(timeit.repeat(func, setup=setup, number=1, repeat=repeat))
+    setup()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return dict(seconds=seconds, peak_bytes=peak)
+
+
+SPHINX_OVERRIDES = dict(
+    extensions=['sphinx.ext.autodoc', 'sphinx.ext.extlinks'],
+    project='pkg',
+)
+"""
+Overrides for the shipped configuration, leaving out the extensions that
+need project metadata or the network.
+"""
+
+
+def sphinx_build(root: pathlib.Path, log: pathlib.Path) -> dict[str, float]:
+    """
+    Build the docs for the package at root from scratch in a fresh
+    interpreter, as the ``coherent.docs`` command does, reporting the
+    duration and the peak resident memory of the build.
+    """
+    overlay = envs.overlay('pkg', root / core.OVERLAY, root)
+    defines = [
+        arg
+        for name, value in SPHINX_OVERRIDES.items()
+        for arg in ('-D', f'{name}={json.dumps(value)}')
+    ]
+    cmd = [sys.executable, '-m', 'coherent.docs.runner', '-d', os.fspath(core.DOCTREES)]
+    cmd += [*defines, 'docs', os.fspath(core.HTML)]
+    began = time.perf_counter()
+    with log.open('w', encoding='utf-8') as out:
+        code = subprocess.call(
+            cmd, env=core.build_env(overlay), stdout=out, stderr=subprocess.STDOUT
+        )
+    seconds = time.perf_counter() - began
+    # ru_maxrss is reported in KiB (on Linux)
+    peak = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+    return dict(seconds=seconds, peak_bytes=peak, status=code)
+
+
+def bench_scale(
+    modules: int,
+    depth: int,
+    members: int,
+    private: float,
+    repeat: int,
+    sphinx: bool = True,
+) -> dict[str, dict[str, float]]:
+    """
+    Measure each stage of generating and building the docs for a
+    synthetic package.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        root = pathlib.Path(tmp)
+        make_package(root, modules, depth, members, private)
+        found = core.find_modules('pkg', root)
+
+        def configure():
+            with core.configure_docs('pkg'):
+                pass
+
+        discover = functools.partial(core.find_modules, 'pkg', root)
+        results = dict(
+            find_modules=measure(discover, repeat, setup=uncached(root)),
+            find_modules_warm=measure(discover, repeat),
+            make_index_rst=measure(lambda: core.make_index_rst('pkg', found), repeat),
+        )
+        with working_dir(root):
+            results.update(configure_docs=measure(configure, repeat))
+            if sphinx:
+                with core.configure_docs('pkg'):
+                    log = root / 'build' / 'bench-sphinx.log'
+                    results.update(sphinx=sphinx_build(root, log))
+        results.update(modules=dict(public=len(found)))
+        return results
+
+
+def report(benchmark: str, parameters: dict, results: dict) -> dict:
+    return dict(
+        benchmark=benchmark,
+        parameters=parameters,
+        python=sys.version,
+        results=results,
+    )
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog='coherent.docs.bench')
+    parser.add_argument('--modules', type=int, default=100)
+    parser.add_argument('--venv-files', type=int, default=20_000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument(
+        '--output', type=pathlib.Path, help='Also write the results as JSON.'
+    )
+    commands = parser.add_subparsers(dest='command')
+    scale = commands.add_parser(
+        'scale', help='Measure each build stage on a synthetic package.'
+    )
+    scale.add_argument('--modules', type=int, default=1_000)
+    scale.add_argument('--depth', type=positive, default=3)
+    scale.add_argument('--members', type=int, default=10)
+    scale.add_argument(
+        '--private', type=float, default=0.1, help='Fraction of private modules.'
+    )
+    scale.add_argument('--repeat', type=int, default=3)
+    scale.add_argument(
+        '--no-sphinx',
+        dest='sphinx',
+        action='store_false',
+        help='Skip the full Sphinx build.',
+    )
+    # suppressed, so as not to override an --output given ahead of the command
+    scale.add_argument(
+        '--output',
+        type=pathlib.Path,
+        default=argparse.SUPPRESS,
+        help='Also write the results as JSON.',
+    )
+    options = parser.parse_args(args)
+    if options.command == 'scale':
+        parameters = dict(
+            modules=options.modules,
+            depth=options.depth,
+            members=options.members,
+            private=options.private,
+            repeat=options.repeat,
+            sphinx=options.sphinx,
+        )
+        results = bench_scale(**parameters)
+        for name, result in results.items():
+            print(name, ', '.join(f'{key}={value:g}' for key, value in result.items()))
+    else:
+        parameters = dict(
+            modules=options.modules,
+            venv_files=options.venv_files,
+            repeat=options.repeat,
+        )
+        results = bench_discovery(**parameters)
+        for name, seconds in results.items():
+            print(f'{name}: {seconds * 1000:.1f} ms')
+    if options.output:
+        data = report(options.command or 'discovery', parameters, results)
+        options.output.write_text(json.dumps(data, indent=2), encoding='utf-8')
+
+
+__name__ == '__main__' and main()
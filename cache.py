@@ -0,0 +1,243 @@
+"""
+Persistent, content-addressed caches shared across builds and projects.
+"""
+
+import contextlib
+import hashlib
+import os
+import pathlib
+import shutil
+from collections.abc import Iterable
+
+import platformdirs
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+FICLONE = 0x40049409
+"""
+Linux ioctl requesting a copy-on-write clone of a file.
+"""
+
+
+def root(*, env=os.environ) -> pathlib.Path:
+    """
+    Locate the cache directory, honoring ``COHERENT_DOCS_CACHE``.
+
+    >>> root(env=dict(COHERENT_DOCS_CACHE='/tmp/docs-cache')).as_posix()
+    '/tmp/docs-cache'
+    """
+    override = env.get('COHERENT_DOCS_CACHE')
+    return pathlib.Path(override or platformdirs.user_cache_dir('coherent.docs'))
+
+
+def digest(*parts: str) -> str:
+    """
+    Compute a stable digest over the parts.
+
+    >>> digest('a', 'b') == digest('a', 'b')
+    True
+    >>> digest('ab') == digest('a', 'b')
+    False
+    """
+    hash = hashlib.sha256()
+    for part in parts:
+        hash.update(part.encode('utf-8'))
+        hash.update(b'\0')
+    return hash.hexdigest()[:32]
+
+
+def files_digest(root: pathlib.Path, paths: Iterable[pathlib.Path]) -> str:
+    """
+    Compute a digest over the names and contents of paths relative to root.
+    """
+    hash = hashlib.sha256()
+    for path in sorted(paths):
+        hash.update(path.as_posix().encode('utf-8') + b'\0')
+        hash.update(hashlib.sha256((root / path).read_bytes()).digest())
+    return hash.hexdigest()[:32]
+
+
+def clone(src, dst):
+    """
+    Copy src to dst, sharing blocks with a reflink where the filesystem
+    supports it.
+
+    Hardlinks aren't suitable, because Sphinx rewrites its outputs in
+    place and would corrupt the cached copy.
+    """
+    try:
+        with open(src, 'rb') as source, open(dst, 'wb') as target:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+    except (AttributeError, OSError):
+        return shutil.copy2(src, dst)
+    shutil.copystat(src, dst)
+    return dst
+
+
+def copy(source: pathlib.Path, target: pathlib.Path) -> None:
+    """
+    Replace the tree at target with a clone of source.
+    """
+    shutil.rmtree(target, ignore_errors=True)
+    shutil.copytree(source, target, copy_function=clone)
+
+
+def size(path: pathlib.Path) -> int:
+    """
+    Total size in bytes of the files under path.
+    """
+    return sum(
+        (pathlib.Path(dir) / name).lstat().st_size
+        for dir, _, names in os.walk(path)
+        for name in names
+    )
+
+
+class Store:
+    """
+    A directory of entries keyed by digest, evicting the least-recently
+    used entries once the total size exceeds ``limit`` bytes.
+
+    Each entry ``<key>`` is accompanied by a ``<key>.used`` stamp recording
+    its size; the stamp's mtime records the last use. Entries held with
+    :meth:`using` (by any process) are never evicted.
+
+    >>> import tempfile, unittest.mock
+    >>> tmp = tempfile.TemporaryDirectory()
+    >>> env = unittest.mock.patch.dict(os.environ, COHERENT_DOCS_CACHE=tmp.name)
+    >>> _ = env.start()
+    >>> def populate(size):
+    ...     return lambda path: path.joinpath('data').write_bytes(b'x' * size)
+    >>> store = Store('demo', limit=10)
+    >>> _ = store.add('a', populate(4))
+    >>> _ = store.add('b', populate(4))
+    >>> store.path.joinpath('a.used').read_text()
+    '4'
+
+    Once over the limit, the least-recently used entry is evicted.
+
+    >>> os.utime(store.path / 'b.used', (1, 1))
+    >>> os.utime(store.path / 'a.used', (2, 2))
+    >>> _ = store.add('c', populate(4))
+    >>> store.get('b') is None, store.get('a') is not None
+    (True, True)
+
+    The entry just added is kept, even if it alone exceeds the limit,
+    as are entries in use.
+
+    >>> with store.using('a'):
+    ...     _ = store.add('big', populate(16))
+    >>> [key for key in ('a', 'c', 'big') if store.get(key)]
+    ['a', 'big']
+
+    Adding an entry that's already present (as by a concurrent run)
+    keeps the existing one, which may be in use.
+
+    >>> store.add('big', populate(1)).joinpath('data').stat().st_size
+    16
+
+    Removing an entry (as by ``--refresh-env``) allows it to be replaced.
+
+    >>> store.remove('big')
+    >>> store.get('big') is None
+    True
+    >>> store.add('big', populate(1)).joinpath('data').stat().st_size
+    1
+
+    >>> _ = env.stop()
+    >>> tmp.cleanup()
+    """
+
+    def __init__(self, name: str, limit: int):
+        self.path = root() / name
+        self.limit = limit
+
+    def _stamp(self, key):
+        return self.path / f'{key}.used'
+
+    def _lock(self, key):
+        return self.path / f'{key}.lock'
+
+    def get(self, key: str) -> pathlib.Path | None:
+        entry = self.path / key
+        if not self._stamp(key).exists():
+            return None
+        self._stamp(key).touch()
+        return entry
+
+    def add(self, key: str, populate) -> pathlib.Path:
+        """
+        Create the entry for key by calling ``populate`` with a
+        scratch directory, which is then moved into place (unless
+        another process added the entry meanwhile).
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        entry = self.path / key
+        scratch = self.path / f'.{key}.{os.getpid()}'
+        shutil.rmtree(scratch, ignore_errors=True)
+        scratch.mkdir()
+        try:
+            populate(scratch)
+            try:
+                scratch.rename(entry)
+            except OSError:
+                if not entry.is_dir():
+                    raise
+        finally:
+            shutil.rmtree(scratch, ignore_errors=True)
+        self._stamp(key).write_text(str(size(entry)), encoding='utf-8')
+        self.prune(keep=key)
+        return entry
+
+    def remove(self, key: str) -> None:
+        self._stamp(key).unlink(missing_ok=True)
+        shutil.rmtree(self.path / key, ignore_errors=True)
+
+    @contextlib.contextmanager
+    def using(self, key: str):
+        """
+        Hold the entry for key in use, protecting it from eviction.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        with self._lock(key).open('a') as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_SH)
+            yield
+
+    def _evict(self, key: str) -> bool:
+        """
+        Remove the entry for key unless it's in use.
+        """
+        with self._lock(key).open('a') as lock:
+            try:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return False
+            self.remove(key)
+            return True
+
+    def _usage(self):
+        for stamp in self.path.glob('*.used'):
+            try:
+                used = stamp.stat().st_mtime
+                yield used, stamp.stem, int(stamp.read_text(encoding='utf-8'))
+            except (OSError, ValueError):
+                # removed (or being written) concurrently
+                continue
+
+    def prune(self, keep: str | None = None) -> None:
+        """
+        Evict least-recently used entries (other than ``keep`` and those
+        in use) until the store fits within its limit.
+        """
+        usage = sorted(self._usage())
+        total = sum(size for _, _, size in usage)
+        for _, key, size in usage:
+            if total <= self.limit:
+                break
+            if key != keep and self._evict(key):
+                total -= size
@@ -1,15 +1,27 @@
+import argparse
+import ast
+import concurrent.futures
 import contextlib
+import filecmp
+import fnmatch
+import functools
 import importlib.resources
+import importlib.util
+import json
 import os
 import pathlib
 import re
+import shutil
 import subprocess
 import sys
+from collections.abc import Container, Iterable, Iterator
 
-import pip_run.deps
 import pip_run.launch
 from coherent.build import bootstrap, discovery
 
+from . import __requires__ as toolchain
+from . import autodoc, cache, envs, inventory, server, static, timing, watch
+
 AUTOMODULE_TMPL = """\
 
 .. automodule:: {mod}
@@ -18,49 +30,397 @@ AUTOMODULE_TMPL = """\
    :show-inheritance:
 """
 
+HTML = pathlib.Path('build/html')
 
-def find_modules(package_name: str, root: pathlib.Path = pathlib.Path()) -> list[str]:
+TIMINGS = pathlib.Path('build/docs-timings.json')
+PROFILE = pathlib.Path('build/docs-profile.pstats')
+AUTODOC = pathlib.Path('build/docs-autodoc.json')
+"""
+Autodoc cost of each documented module, slowest first.
+"""
+
+OVERLAY = pathlib.Path('build/docs-overlay')
+"""
+Directory exposing the project for import ahead of the environment.
+"""
+
+DOCTREES = pathlib.Path('build/doctrees')
+"""
+Persistent Sphinx environment and doctrees, reused across builds.
+"""
+
+
+DISCOVERY = pathlib.Path('build/docs-discovery.json')
+"""
+Cached directory listings from module discovery, relative to the root.
+"""
+
+PRUNE = {'build', 'dist', 'docs', 'node_modules', 'site-packages'}
+"""
+Names of top-level directories never searched for modules.
+"""
+
+
+def pruned(name: str, ignored=lambda name: False, top: bool = False) -> bool:
     """
-    Find all public modules in the package using the essential layout.
+    Should discovery skip the directory named ``name`` (at the ``top``
+    of the project, or nested)?
 
-    >>> find_modules('my.pkg', pathlib.Path('/nonexistent'))
-    []
+    Hidden, private and non-importable directories can't contain public
+    modules. The :data:`PRUNE` directories are skipped at the top only,
+    so subpackages may share their names.
+
+    >>> pruned('pkg')
+    False
+    >>> [pruned(name) for name in ('.venv', '__pycache__', '(meta)', 'build')]
+    [True, True, True, False]
+    >>> pruned('build', top=True)
+    True
+    """
+    return (
+        name.startswith(('.', '_'))
+        or not name.isidentifier()
+        or (top and name in PRUNE)
+        or ignored(name)
+    )
+
+
+def excluded(parts: tuple[str, ...]) -> bool:
+    """
+    Should discovery skip the files in the directory at the relative
+    path ``parts``?
+
+    >>> excluded(('build', 'lib')), excluded(('pkg', 'build')), excluded(())
+    (True, False, False)
+    """
+    return any(pruned(name, top=not index) for index, name in enumerate(parts))
+
+
+def gitignored(root: pathlib.Path):
+    """
+    Return a predicate matching names against the simple patterns in
+    the root ``.gitignore``.
     """
+    try:
+        lines = (root / '.gitignore').read_text(encoding='utf-8').splitlines()
+    except OSError:
+        lines = []
+    patterns = [
+        line.strip().strip('/')
+        for line in lines
+        if line.strip() and not line.startswith(('#', '!'))
+    ]
+    return lambda name: any(fnmatch.fnmatch(name, pat) for pat in patterns)
 
-    def to_module(path):
-        parts = path.relative_to(root).with_suffix('').parts
+
+def git_sources(root: pathlib.Path) -> list[pathlib.Path] | None:
+    """
+    List Python files tracked or unignored in the git index, or None
+    if root is not in a git checkout.
+    """
+    cmd = ['git', 'ls-files', '-z', '--cached', '--others', '--exclude-standard']
+    try:
+        proc = subprocess.run(
+            cmd + ['--', '*.py'], cwd=root, capture_output=True, check=True
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    paths = map(pathlib.PurePosixPath, filter(None, proc.stdout.decode().split('\0')))
+    return [
+        pathlib.Path(path)
+        for path in paths
+        if not excluded(path.parts[:-1]) and (root / path).is_file()
+    ]
+
+
+def listing(path: pathlib.Path, ignored, top: bool = False) -> dict[str, list[str]]:
+    """
+    List the Python files and the directories worth descending into
+    at path (the ``top`` of the project, or nested). A virtualenv
+    yields nothing.
+    """
+    with os.scandir(path) as scan:
+        entries = list(scan)
+    if any(entry.name == 'pyvenv.cfg' for entry in entries):
+        return dict(files=[], dirs=[])
+    files = [
+        entry.name
+        for entry in entries
+        if entry.name.endswith('.py') and not ignored(entry.name) and entry.is_file()
+    ]
+    dirs = [
+        entry.name
+        for entry in entries
+        if entry.is_dir(follow_symlinks=False)
+        and not pruned(entry.name, ignored, top)
+    ]
+    return dict(files=sorted(files), dirs=sorted(dirs))
+
+
+def scan(root: pathlib.Path, rel: pathlib.Path, ignored, cached, scanned):
+    """
+    Yield the Python files under rel, listing only those directories
+    whose mtime no longer matches their cached listing.
+    """
+    try:
+        mtime = (root / rel).stat().st_mtime_ns
+    except OSError:
+        return
+    key = rel.as_posix()
+    entry = cached.get(key)
+    if entry is None or entry['mtime'] != mtime:
+        entry = dict(listing(root / rel, ignored, top=not rel.parts), mtime=mtime)
+    scanned[key] = entry
+    yield from (rel / name for name in entry['files'])
+    for name in entry['dirs']:
+        yield from scan(root, rel / name, ignored, cached, scanned)
+
+
+def walk_sources(root: pathlib.Path) -> list[pathlib.Path]:
+    """
+    Walk the Python files under root, pruning directories before
+    descending into them.
+
+    Directory listings are cached in :data:`DISCOVERY` under root, so
+    only directories that changed since the last walk (or all of them,
+    if ``.gitignore`` changed) are listed again.
+
+    >>> import tempfile
+    >>> tmp = tempfile.TemporaryDirectory()
+    >>> root = pathlib.Path(tmp.name)
+    >>> def walked():
+    ...     return sorted(path.as_posix() for path in walk_sources(root))
+    >>> root.joinpath('sub').mkdir()
+    >>> _ = root.joinpath('sub', 'a.py').write_text('')
+    >>> walked()
+    ['sub/a.py']
+
+    A directory whose mtime is unchanged isn't listed again.
+
+    >>> sub = root / 'sub'
+    >>> stat = sub.stat()
+    >>> _ = sub.joinpath('b.py').write_text('')
+    >>> os.utime(sub, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    >>> walked()
+    ['sub/a.py']
+    >>> os.utime(sub, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000))
+    >>> walked()
+    ['sub/a.py', 'sub/b.py']
+
+    Changing ``.gitignore`` invalidates every listing.
+
+    >>> _ = root.joinpath('.gitignore').write_text('a.py\\n')
+    >>> walked()
+    ['sub/b.py']
+    >>> tmp.cleanup()
+    """
+    ignored = gitignored(root)
+    cache_file = root / DISCOVERY
+    try:
+        signature = (root / '.gitignore').stat().st_mtime_ns
+    except OSError:
+        signature = None
+    cached = {}
+    with contextlib.suppress(OSError, ValueError):
+        saved = json.loads(cache_file.read_text(encoding='utf-8'))
+        # earlier listings pruned the PRUNE directories at every depth
+        if saved.get('version') == 2 and saved['gitignore'] == signature:
+            cached = saved['dirs']
+    scanned = {}
+    found = list(scan(root, pathlib.Path(), ignored, cached, scanned))
+    if scanned and scanned != cached:
+        with contextlib.suppress(OSError):
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            data = dict(version=2, gitignore=signature, dirs=scanned)
+            cache_file.write_text(json.dumps(data))
+    return found
+
+
+def source_files(root: pathlib.Path) -> Iterable[pathlib.Path]:
+    """
+    Find the Python files under root (relative to root), using the git
+    index when available.
+    """
+    found = git_sources(root)
+    return walk_sources(root) if found is None else found
+
+
+def iter_modules(
+    package_name: str, root: pathlib.Path = pathlib.Path()
+) -> Iterator[str]:
+    """
+    Yield the public modules in the package using the essential layout,
+    in the order they're discovered.
+    """
+    for path in source_files(root):
+        parts = path.with_suffix('').parts
         if parts[-1] == '__init__':
             parts = parts[:-1]
-        return '.'.join((package_name,) + parts) if parts else package_name
+        module = '.'.join((package_name,) + parts) if parts else package_name
+        if not re.search(r'\._', module):
+            yield module
 
-    return sorted(
-        filter(
-            lambda m: not re.search(r'\._', m),
-            map(to_module, root.rglob('*.py')),
-        ),
-        key=lambda m: (m.count('.'), m),
-    )
 
+def find_modules(package_name: str, root: pathlib.Path = pathlib.Path()) -> list[str]:
+    """
+    Find all public modules in the package using the essential layout,
+    packages ahead of their modules.
+
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as tmp:
+    ...     find_modules('my.pkg', pathlib.Path(tmp))
+    []
+    """
+    return sorted(iter_modules(package_name, root), key=lambda m: (m.count('.'), m))
+
+
+TOCTREE_TMPL = """
+.. toctree::
+   :maxdepth: 1
+
+{entries}"""
 
-def make_modules_rst(modules: list[str]) -> str:
+
+def make_module_rst(
+    module: str, children: list[str] = (), body: str | None = None
+) -> str:
     """
-    Generate the automodule directives for each public module.
+    Generate the page documenting a module, with a toctree of its
+    child modules. The module is documented by ``automodule`` unless
+    another body is given.
+
+    >>> print(make_module_rst('my.pkg', ['my.pkg.mod']))
+    my.pkg
+    ======
+    <BLANKLINE>
+    .. automodule:: my.pkg
+       :members:
+       :undoc-members:
+       :show-inheritance:
+    <BLANKLINE>
+    .. toctree::
+       :maxdepth: 1
+    <BLANKLINE>
+       my.pkg.mod
+    <BLANKLINE>
     """
-    return ''.join(AUTOMODULE_TMPL.format(mod=m) for m in modules)
+    body = AUTOMODULE_TMPL.format(mod=module) if body is None else body
+    page = f'{module}\n{"=" * len(module)}\n' + body
+    if children:
+        page += TOCTREE_TMPL.format(entries=make_toctree_rst(children))
+    return page
 
 
-def make_index_rst(package_name: str, modules: list[str]) -> str:
+def nearest_parent(module: str, present: Container[str]) -> str | None:
+    """
+    Find the closest ancestor of module among those present.
+
+    >>> nearest_parent('my.pkg.sub.mod', {'my.pkg'})
+    'my.pkg'
+    >>> nearest_parent('my.pkg', {'my.pkg'}) is None
+    True
+    """
+    while '.' in module:
+        module = module.rpartition('.')[0]
+        if module in present:
+            return module
+    return None
+
+
+def hierarchy(modules: list[str]) -> dict[str | None, list[str]]:
     """
-    Generate ``index.rst`` content from the template plus
-    ``automodule`` directives for each public module.
+    Group modules under their nearest parent; top-level modules are
+    grouped under None.
+
+    >>> tree = hierarchy(['my.pkg', 'my.pkg.a', 'my.pkg.sub', 'my.pkg.sub.b'])
+    >>> tree[None], tree['my.pkg'], tree['my.pkg.sub']
+    (['my.pkg'], ['my.pkg.a', 'my.pkg.sub'], ['my.pkg.sub.b'])
+    """
+    present = set(modules)
+    tree: dict[str | None, list[str]] = {}
+    for module in modules:
+        tree.setdefault(nearest_parent(module, present), []).append(module)
+    return tree
+
+
+def iter_modules_rst(modules: list[str], document=None) -> Iterator[tuple[str, str]]:
+    """
+    Generate the page for each module lazily, as (document name, content)
+    pairs, so only one page is held at a time. ``document`` renders the
+    body for a module in place of ``automodule``.
+
+    >>> pages = iter_modules_rst(['my.pkg', 'my.pkg.mod'])
+    >>> [name for name, _ in pages]
+    ['my.pkg', 'my.pkg.mod']
+    """
+    tree = hierarchy(modules)
+    for module in modules:
+        body = document(module) if document else None
+        yield module, make_module_rst(module, tree.get(module, []), body)
+
+
+def static_document(package_name: str, root: pathlib.Path = pathlib.Path()):
+    """
+    Document modules from their source (see :mod:`coherent.docs.static`)
+    rather than by importing them.
+    """
+
+    def document(module):
+        return static.document(module, static.source_path(package_name, module, root))
+
+    return document
+
+
+def make_modules_rst(modules: list[str]) -> dict[str, str]:
     """
-    template = (
+    Generate a page with the automodule directive for each public module,
+    keyed by document name. Package pages link their child modules, so
+    navigation stays shallow.
+    """
+    return dict(iter_modules_rst(modules))
+
+
+def make_toctree_rst(modules: list[str]) -> str:
+    """
+    Generate the toctree entries for the module pages.
+
+    >>> print(make_toctree_rst(['my.pkg', 'my.pkg.mod']), end='')
+       my.pkg
+       my.pkg.mod
+    """
+    return ''.join(f'   {m}\n' for m in modules)
+
+
+@functools.cache
+def index_template() -> str:
+    return (
         importlib.resources
         .files(__package__)
         .joinpath('index.tmpl.rst')
         .read_text('utf-8')
     )
-    return template.format(modules=make_modules_rst(modules))
+
+
+def iter_index_rst(package_name: str, modules: list[str]) -> Iterator[str]:
+    """
+    Generate ``index.rst`` content in chunks: the template around a
+    toctree entry for each top-level module's page.
+    """
+    head, _, tail = index_template().partition('{modules}')
+    yield head
+    present = set(modules)
+    for module in modules:
+        if nearest_parent(module, present) is None:
+            yield f'   {module}\n'
+    yield tail
+
+
+def make_index_rst(package_name: str, modules: list[str]) -> str:
+    """
+    Generate ``index.rst`` content from the template plus a toctree
+    entry for each top-level module's page.
+    """
+    return ''.join(iter_index_rst(package_name, modules))
 
 
 def build_env(target, *, orig=os.environ):
@@ -82,51 +442,638 @@ def build_env(target, *, orig=os.environ):
     return {**orig, **overlay}
 
 
+def write_chunks(target: pathlib.Path, chunks: Iterable[str]) -> None:
+    with target.open('w', encoding='utf-8') as out:
+        out.writelines(chunks)
+
+
+@contextlib.contextmanager
+def assured(target: pathlib.Path, make, stash: pathlib.Path = DOCTREES / 'sources'):
+    """
+    Like :func:`bootstrap.assured`, but restore the content and mtime of
+    the previously generated file when unchanged, so Sphinx doesn't
+    consider it outdated.
+
+    ``make`` returns the content as an iterable of chunks, written to
+    target as they're generated.
+    """
+    if target.exists():
+        yield
+        return
+    write_chunks(target, make())
+    saved = stash / f'{target.name}.saved'
+    if saved.exists() and filecmp.cmp(saved, target, shallow=False):
+        shutil.copy2(saved, target)
+    else:
+        stash.mkdir(parents=True, exist_ok=True)
+        shutil.copy2(target, saved)
+    try:
+        yield
+    finally:
+        target.unlink(missing_ok=True)
+
+
 def load_conf_py():
     return importlib.resources.files(__package__).joinpath('conf.py').read_text('utf-8')
 
 
+NAMESPACES = {'azure', 'backports', 'google', 'jaraco', 'sphinxcontrib', 'zope'}
+"""
+Well-known namespace packages, whose modules are provided by distinct
+distributions.
+"""
+
+
+def mock_target(
+    package_name: str, module: str, namespaces: Container[str] = NAMESPACES
+) -> str | None:
+    """
+    Resolve the module to mock for an import by the project, or None
+    if it's provided by the standard library, the project itself or
+    the doc toolchain.
+
+    Modules in a namespace (the project's own or one of ``namespaces``)
+    resolve to the package in that namespace.
+
+    >>> mock_target('my.pkg', 'numpy.linalg')
+    'numpy'
+    >>> mock_target('my.pkg', 'my.other.util')
+    'my.other'
+    >>> mock_target('my.pkg', 'google.protobuf.message')
+    'google.protobuf'
+    >>> mock_target('my.pkg', 'jaraco.functools')
+    'jaraco.functools'
+    >>> names = ('os.path', 'my.pkg.mod', 'sphinx', 'jaraco.packaging.sphinx', 'my')
+    >>> [mock_target('my.pkg', name) for name in names]
+    [None, None, None, None, None]
+    """
+    top = module.partition('.')[0]
+    own = module == package_name or module.startswith(package_name + '.')
+    if top in sys.stdlib_module_names or own:
+        return None
+    target = top
+    if top in namespaces or (
+        '.' in package_name and top == package_name.partition('.')[0]
+    ):
+        target = '.'.join(module.split('.')[:2])
+        if target == top:
+            return None
+    provided = {envs.canonical(envs.requirement_name(req)) for req in toolchain}
+    return None if envs.canonical(target) in provided else target
+
+
+def heavy_imports(
+    package_name: str, modules: list[str], root: pathlib.Path = pathlib.Path()
+) -> list[str]:
+    """
+    Find the third-party modules imported when the project's modules
+    are, to be mocked for autodoc.
+    """
+    imported = set()
+    for module in modules:
+        path = static.source_path(package_name, module, root)
+        with contextlib.suppress(OSError, SyntaxError):
+            imported |= static.imports(ast.parse(path.read_bytes()))
+    namespaces = NAMESPACES | envs.namespaces(root)
+    targets = (mock_target(package_name, name, namespaces) for name in imported)
+    return sorted(set(filter(None, targets)))
+
+
+def mocked(package_name: str, names: list[str] | None) -> list[str]:
+    """
+    Resolve the modules to mock: none if names is None, those named, or
+    if none are named, all the third-party modules the project imports.
+    """
+    if names is None:
+        return []
+    return sorted(names) or heavy_imports(package_name, find_modules(package_name))
+
+
+def authored(root: pathlib.Path = pathlib.Path()) -> bool:
+    """
+    Does the project at root author its own ``docs/index.rst`` (so the
+    module pages aren't generated)?
+    """
+    return root.joinpath('docs', 'index.rst').exists()
+
+
+def is_static(options, root: pathlib.Path = pathlib.Path()) -> bool:
+    """
+    Are the project's modules documented from source (see ``--static``)?
+
+    Only the generated module pages can be, so an authored ``index.rst``
+    (whose ``automodule`` directives import the project) requires the
+    project's dependencies regardless.
+    """
+    return options.static and not authored(root)
+
+
 @contextlib.contextmanager
-def configure_docs(package_name: str):
+def configure_docs(
+    package_name: str,
+    timings: timing.Timings | None = None,
+    static: bool = False,
+):
     """
     Create the ``docs/`` directory and generate ``conf.py`` and ``index.rst``
     (only if they do not already exist), yielding for the sphinx build, then
     cleaning up any files we created.
+
+    A generated ``index.rst`` links a generated page for each module,
+    documented from its source without importing it if ``static``.
+
+    Yields a function that regenerates ``index.rst`` and the module pages
+    if the set of modules (or, if static, their content) has changed,
+    returning whether it did. Its ``generated`` attribute holds the paths
+    of the files generated, so watchers can ignore them.
     """
+    timings = timings or timing.Timings()
     docs = pathlib.Path('docs')
     docs.mkdir(exist_ok=True)
-    modules = find_modules(package_name)
-    with (
-        bootstrap.assured(docs / 'conf.py', load_conf_py),
-        bootstrap.assured(
-            docs / 'index.rst', lambda: make_index_rst(package_name, modules)
-        ),
-    ):
-        yield
+    index = docs / 'index.rst'
+    generated = not index.exists()
+    with timings.phase('modules'):
+        modules = find_modules(package_name)
+
+    with contextlib.ExitStack() as stack:
+        # digests of the generated pages, rather than their content
+        pages: dict[str, str] = {}
+        written = {path for path in (docs / 'conf.py', index) if not path.exists()}
+        document = static_document(package_name) if static else None
+
+        def generate_pages():
+            nonlocal pages
+            wanted = {}
+            generate = iter_modules_rst(modules, document) if generated else ()
+            for name, content in generate:
+                page = docs / f'{name}.rst'
+                wanted[name] = cache.digest(content)
+                written.add(page)
+                if name not in pages:
+                    stack.enter_context(assured(page, lambda: [content]))
+                elif pages[name] != wanted[name]:
+                    page.write_text(content, encoding='utf-8')
+            for name in pages.keys() - wanted.keys():
+                (docs / f'{name}.rst').unlink(missing_ok=True)
+            changed, pages = wanted != pages, wanted
+            return changed
+
+        def regenerate():
+            nonlocal modules
+            current = find_modules(package_name)
+            if not generated or (current == modules and not static):
+                return False
+            if current != modules:
+                modules = current
+                write_chunks(index, iter_index_rst(package_name, modules))
+            return generate_pages()
+
+        regenerate.generated = written
+
+        with timings.phase('generate'):
+            stack.enter_context(assured(docs / 'conf.py', lambda: [load_conf_py()]))
+            stack.enter_context(
+                assured(index, lambda: iter_index_rst(package_name, modules))
+            )
+            generate_pages()
+        yield regenerate
+
+
+def project_version() -> str:
+    """
+    The project's version from its VCS, or ``0`` if it's not versioned.
+    """
+    with contextlib.suppress(LookupError, OSError):
+        return discovery.version_from_vcs()
+    return '0'
 
 
 @contextlib.contextmanager
-def project_on_path():
+def project_on_path(
+    package_name: str,
+    *,
+    refresh: bool = False,
+    installer: str = 'uv',
+    wheelhouse: pathlib.Path | None = None,
+    timings: timing.Timings | None = None,
+    static: bool = False,
+    mock: list[str] = (),
+):
     """
-    Install the target project plus doc build dependencies in an ephemeral
-    environment and yield the installation home path.
+    Provide the doc build dependencies in a cached environment and the
+    target project in an overlay (:data:`OVERLAY`), yielding the
+    environment's home path.
+
+    The environment is reused until the doc requirements or the
+    interpreter change, or ``refresh`` is requested. It's provisioned
+    with ``installer`` (uv, falling back to pip, or pip), exclusively
+    from ``wheelhouse`` if given, and from the project's lockfile when
+    it has one. If ``static``, the project's own dependencies are left
+    out (and the lockfile ignored), as the project isn't imported.
+    Likewise, dependencies providing the modules in ``mock`` are left out.
     """
-    deps = pip_run.deps.load('--editable', '.[doc]')
-    with bootstrap.write_pyproject(), deps as home:
+    timings = timings or timing.Timings()
+    with contextlib.ExitStack() as stack:
+        with timings.phase('pyproject'):
+            stack.enter_context(bootstrap.write_pyproject())
+        with timings.phase('environment'):
+            lock = None if static or mock else envs.locked()
+            deps = envs.load(
+                *([] if lock else envs.requirements(static=static, mock=mock)),
+                key=envs.dependencies_key(static=static, mock=mock),
+                refresh=refresh,
+                installer=installer,
+                wheelhouse=wheelhouse,
+                lock=lock,
+            )
+            home = stack.enter_context(deps)
+            envs.overlay(package_name, OVERLAY, version=project_version())
         yield home
 
 
-def run():
-    package_name = discovery.best_name()
-    with project_on_path() as home:
-        with configure_docs(package_name):
-            cmd = [
-                sys.executable,
-                '-m',
-                'sphinx',
-                '-b',
-                'html',
-                'docs',
-                'build/html',
-            ]
-            raise SystemExit(subprocess.call(cmd, env=build_env(home)))
+def lint(docs: pathlib.Path = pathlib.Path('docs')) -> str:
+    """
+    Check the docs sources with sphinx-lint, if it's installed,
+    returning its report.
+    """
+    if importlib.util.find_spec('sphinxlint') is None:
+        return 'sphinx-lint is not installed; skipped linting.'
+    cmd = [sys.executable, '-m', 'sphinxlint', os.fspath(docs)]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    return (proc.stdout + proc.stderr).strip()
+
+
+@contextlib.contextmanager
+def prepared(package_name: str, options, timings: timing.Timings | None = None):
+    """
+    Provide the environment (:func:`project_on_path`) and the docs
+    sources (:func:`configure_docs`) concurrently, yielding the
+    environment's home and the function regenerating the sources.
+
+    While the environment is provisioned, once the sources are
+    generated, the intersphinx inventories they configure are fetched
+    into the cache (unless offline) and, if requested, the sources are
+    linted.
+
+    The modules to mock (see :func:`mocked`) are resolved first, as
+    they determine the environment, and recorded as ``options.mocked``
+    for the build.
+    """
+    timings = timings or timing.Timings()
+    with timings.phase('mocks'):
+        mock = options.mocked = mocked(package_name, options.mock)
+    static = is_static(options)
+    if options.static and not static:
+        print('--static has no effect with an authored docs/index.rst.')
+
+    def prefetch():
+        # best effort; the build resolves the inventories regardless
+        with timings.phase('inventories'):
+            try:
+                inventory.prefetch(pathlib.Path('docs/conf.py'), options.inventory_ttl)
+            except Exception as exc:
+                print(f'Inventory prefetch failed: {exc!r}', file=sys.stderr)
+
+    def check():
+        with timings.phase('lint'):
+            return lint()
+
+    env = project_on_path(
+        package_name,
+        refresh=options.refresh_env,
+        installer=options.installer,
+        wheelhouse=options.wheelhouse if options.offline else None,
+        timings=timings,
+        static=static,
+        mock=mock,
+    )
+    docs = configure_docs(package_name, timings=timings, static=static)
+    with contextlib.ExitStack() as stack:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+            home = pool.submit(stack.enter_context, env)
+            regenerate = pool.submit(stack.enter_context, docs).result()
+            prefetched = None if options.offline else pool.submit(prefetch)
+            linted = pool.submit(check) if options.lint else None
+            home = home.result()
+            if prefetched:
+                prefetched.result()
+            report = linted.result() if linted else ''
+        if report:
+            print(report)
+        yield home, regenerate
+
+
+MEMORY_PER_JOB = 512 * 2**20
+"""
+Memory in bytes budgeted for each parallel Sphinx process.
+"""
+
+
+def available_cpus() -> int:
+    with contextlib.suppress(AttributeError):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def available_memory(meminfo=pathlib.Path('/proc/meminfo')) -> int | None:
+    """
+    Memory available for new processes, preferring the kernel's estimate
+    (which, unlike free pages, includes reclaimable page cache).
+
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as tmp:
+    ...     path = pathlib.Path(tmp, 'meminfo')
+    ...     _ = path.write_text('MemFree: 1024 kB\\nMemAvailable: 4096 kB\\n')
+    ...     available_memory(path)
+    4194304
+    """
+    with contextlib.suppress(OSError, ValueError):
+        for line in meminfo.read_text(encoding='ascii').splitlines():
+            name, _, value = line.partition(':')
+            if name == 'MemAvailable':
+                return int(value.split()[0]) * 1024
+    with contextlib.suppress(AttributeError, ValueError, OSError):
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    return None
+
+
+def jobs(spec: str, *, cpus=None, memory=None) -> int:
+    """
+    Resolve the number of parallel Sphinx jobs; ``auto`` sizes it from
+    the available CPUs and memory.
+
+    >>> jobs('4')
+    4
+    >>> jobs('auto', cpus=64, memory=8 * 2**30)
+    16
+    >>> jobs('auto', cpus=2, memory=None)
+    2
+    >>> jobs('auto', cpus=4, memory=0)
+    1
+    """
+    if spec != 'auto':
+        return max(int(spec), 1)
+    cpus = cpus or available_cpus()
+    if memory is None:
+        memory = available_memory()
+    by_memory = cpus if memory is None else memory // MEMORY_PER_JOB
+    return max(min(cpus, by_memory), 1)
+
+
+def add_build_arguments(parser: argparse.ArgumentParser) -> None:
+    """
+    Add the options shared by single-project and batch builds.
+    """
+    parser.add_argument(
+        '--refresh-env',
+        action='store_true',
+        help='Rebuild the cached doc environment.',
+    )
+    parser.add_argument(
+        '--installer',
+        choices=['uv', 'pip'],
+        default='uv',
+        help='Provision the doc environment with uv (if available) or pip.',
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=jobs,
+        default='auto',
+        help='Number of parallel Sphinx processes (default: auto).',
+    )
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='Invoke Sphinx even when a cached build matches the inputs.',
+    )
+    parser.add_argument(
+        '--offline',
+        action='store_true',
+        help=(
+            'Work without network access, installing only from the wheelhouse '
+            'and using only cached intersphinx inventories.'
+        ),
+    )
+    parser.add_argument(
+        '--wheelhouse',
+        type=pathlib.Path,
+        default=envs.wheelhouse(),
+        help='Local wheelhouse used when offline (default: %(default)s).',
+    )
+    parser.add_argument(
+        '--static',
+        action='store_true',
+        help=(
+            "Document the modules from their source without importing them, "
+            "so the project's dependencies aren't installed (unless "
+            "docs/index.rst is authored)."
+        ),
+    )
+    parser.add_argument(
+        '--inventory-ttl',
+        type=float,
+        default=inventory.DEFAULT_TTL,
+        metavar='DAYS',
+        help='Refetch cached intersphinx inventories older than this.',
+    )
+
+
+def parse_args(args=None):
+    parser = argparse.ArgumentParser(
+        prog='coherent.docs', description='Build the documentation for a project.'
+    )
+    add_build_arguments(parser)
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='Rebuild incrementally as the sources and docs change.',
+    )
+    parser.add_argument(
+        '--mock',
+        nargs='*',
+        metavar='MODULE',
+        help=(
+            'Mock the named modules for autodoc rather than installing the '
+            'dependencies providing them; without names, '
+            'mock every third-party module the project imports.'
+        ),
+    )
+    parser.add_argument(
+        '--lint',
+        action='store_true',
+        help='Check the docs sources with sphinx-lint while the environment loads.',
+    )
+    parser.add_argument(
+        '--profile',
+        nargs='?',
+        const=PROFILE,
+        type=pathlib.Path,
+        metavar='PATH',
+        help=(
+            'Profile the Sphinx build (serially, bypassing the build cache), '
+            'saving pstats to PATH (default: %(const)s) and a summary of the '
+            'time spent by each extension alongside.'
+        ),
+    )
+    parser.add_argument(
+        '--in-process',
+        action='store_true',
+        help='Run Sphinx in this process rather than a fresh interpreter.',
+    )
+    commands = parser.add_subparsers(dest='command')
+    prefetch = commands.add_parser(
+        'prefetch', help="Download the project's doc dependencies to the wheelhouse."
+    )
+    prefetch.add_argument(
+        '--wheelhouse', type=pathlib.Path, default=argparse.SUPPRESS
+    )
+    commands.add_parser(
+        'lock', help=f'Pin the doc dependencies with hashes in {envs.LOCK}.'
+    )
+    return parser.parse_args(args)
+
+
+def sphinx(home: pathlib.Path, options, timings: timing.Timings | None = None) -> int:
+    """
+    Run Sphinx in this process, on the build server when it's running,
+    or in a fresh interpreter, merging its phase timings into timings.
+    """
+    timings = timings or timing.Timings()
+    report = DOCTREES / 'timings.json'
+    report.unlink(missing_ok=True)
+    with timings.phase('sphinx'):
+        code = _sphinx(home, options, report)
+    timings.phases.extend(timing.Timings.load(report).phases)
+    return code
+
+
+def _sphinx(home: pathlib.Path, options, report: pathlib.Path) -> int:
+    overrides = dict(
+        coherent_docs_timings=os.fspath(report),
+        coherent_docs_offline=options.offline,
+        coherent_docs_inventory_ttl=options.inventory_ttl,
+        coherent_docs_autodoc_report=os.fspath(AUTODOC),
+        coherent_docs_mock_imports=options.mocked,
+    )
+    request = dict(
+        srcdir='docs',
+        outdir=os.fspath(HTML),
+        doctreedir=os.fspath(DOCTREES),
+        jobs=options.jobs,
+        overrides=overrides,
+    )
+    if options.profile:
+        request.update(jobs=1, profile=os.fspath(options.profile))
+    overlay = OVERLAY.resolve()
+    if options.in_process:
+        from . import runner
+
+        with runner.on_path(overlay, home):
+            return runner.build(**request)
+    code = server.dispatch(home, request, path=[overlay])
+    if code is not None:
+        return code
+    defines = [
+        arg
+        for name, value in overrides.items()
+        for arg in ('-D', f'{name}={json.dumps(value)}')
+    ]
+    cmd = [
+        sys.executable,
+        '-m',
+        'coherent.docs.runner',
+        '-b',
+        'html',
+        '-d',
+        os.fspath(DOCTREES),
+        '-j',
+        str(request['jobs']),
+        *defines,
+        *(['--profile', request['profile']] if options.profile else []),
+        'docs',
+        os.fspath(HTML),
+    ]
+    return subprocess.call(cmd, env=build_env(overlay, orig=build_env(home)))
+
+
+def inputs_digest(home: pathlib.Path, root: pathlib.Path = pathlib.Path()) -> str:
+    """
+    Digest the inputs to a build: the project sources, the effective
+    ``docs/`` (including generated ``conf.py`` and ``index.rst``), the
+    project's version and metadata inputs, and the environment key.
+    """
+    docs = (path.relative_to(root) for path in (root / 'docs').rglob('*'))
+    paths = {*source_files(root), *docs, pathlib.Path('pyproject.toml')}
+    files = (path for path in paths if (root / path).is_file())
+    try:
+        metadata = envs.metadata_inputs(root)
+    except (OSError, subprocess.CalledProcessError):
+        metadata = ''
+    return cache.digest(
+        home.name, project_version(), metadata, cache.files_digest(root, files)
+    )
+
+
+def html_store():
+    limit = int(os.environ.get('COHERENT_DOCS_HTML_CACHE_SIZE', 2**30))
+    return cache.Store('html', limit=limit)
+
+
+def build(home: pathlib.Path, options, timings: timing.Timings | None = None) -> int:
+    """
+    Build the HTML docs, restoring a previous build for the same inputs
+    from the cache instead of invoking Sphinx when available.
+    """
+    key = inputs_digest(home)
+    store = html_store()
+    cached = None if options.force or options.profile else store.get(key)
+    if cached:
+        with (timings or timing.Timings()).phase('restore'):
+            cache.copy(cached, HTML)
+        print(f'Restored unchanged build to {HTML}.')
+        return 0
+    code = sphinx(home, options, timings)
+    if code == 0:
+        store.add(key, functools.partial(cache.copy, HTML))
+    return code
+
+
+def rebuild_on_change(home: pathlib.Path, options, regenerate) -> int:
+    """
+    Build, then rebuild incrementally whenever the sources or docs
+    change, until interrupted.
+    """
+    sphinx(home, options)
+    with contextlib.suppress(KeyboardInterrupt):
+        changes = watch.batches(pathlib.Path(), excluded, regenerate.generated)
+        for _ in changes:
+            if regenerate():
+                print('Modules changed; regenerated the module pages.')
+            sphinx(home, options)
+    return 0
+
+
+def run(args=None):
+    options = parse_args(args)
+    if options.command == 'prefetch':
+        raise SystemExit(envs.prefetch(options.wheelhouse))
+    if options.command == 'lock':
+        with bootstrap.write_pyproject():
+            print(f'Locked doc dependencies in {envs.lock()}')
+        raise SystemExit()
+    timings = timing.Timings()
+    with timings.phase('name'):
+        package_name = discovery.best_name()
+    with prepared(package_name, options, timings) as (home, regenerate):
+        if options.watch:
+            raise SystemExit(rebuild_on_change(home, options, regenerate))
+        code = build(home, options, timings)
+    timings.save(TIMINGS)
+    print(f'Timings: {timings.summary()}')
+    # a restored build ran no autodoc; the report is from an earlier one
+    restored = any(phase['name'] == 'restore' for phase in timings.phases)
+    slowest = not restored and autodoc.summary(autodoc.load(AUTODOC))
+    if slowest:
+        print(f'Slowest modules: {slowest} (see {AUTODOC})')
+    raise SystemExit(code)
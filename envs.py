@@ -0,0 +1,397 @@
+"""
+Persistent doc build environments, reused across runs until their
+inputs change.
+
+Environments hold only the doc dependencies, so projects with the same
+dependencies share one. Each project is added by a lightweight overlay
+rather than being installed.
+"""
+
+import contextlib
+import email
+import functools
+import importlib.metadata
+import json
+import os
+import pathlib
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+from collections.abc import Iterable
+
+import packaging.requirements
+from coherent.build import bootstrap
+
+from . import __requires__ as toolchain
+from . import cache
+
+DEFAULT_LIMIT = 2 * 2**30
+"""
+Default total size in bytes of cached environments, overridden by
+``COHERENT_DOCS_ENV_CACHE_SIZE``.
+"""
+
+
+def canonical(name: str) -> str:
+    """
+    Normalize a distribution or module name for comparison.
+
+    >>> canonical('jaraco.packaging'), canonical('Typing_Extensions')
+    ('jaraco-packaging', 'typing-extensions')
+    """
+    return re.sub(r'[-_.]+', '-', name).lower()
+
+
+def requirement_name(requirement: str) -> str:
+    """
+    >>> requirement_name('sphinx >= 3.5'), requirement_name('jaraco.packaging>=9')
+    ('sphinx', 'jaraco.packaging')
+    """
+    return re.match(r'[A-Za-z0-9][A-Za-z0-9._-]*', requirement.strip()).group()
+
+
+METADATA = pathlib.Path('build/docs-metadata.json')
+"""
+The project's built metadata, cached with a digest of its inputs,
+relative to the project.
+"""
+
+
+def metadata_inputs(root: pathlib.Path = pathlib.Path()) -> str:
+    """
+    Digest the inputs to the project's metadata: the current commit and
+    the tracked Python sources, from whose imports the build backend
+    infers dependencies.
+    """
+    git = functools.partial(subprocess.check_output, cwd=root, text=True)
+    head = git(['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL)
+    listed = git(['git', 'ls-files', '-z', '--', '*.py']).split('\0')
+    sources = [pathlib.Path(path) for path in listed if (root / path).is_file()]
+    return cache.digest(head, cache.files_digest(root, sources))
+
+
+def built_metadata(root: pathlib.Path = pathlib.Path()) -> str:
+    """
+    Build the metadata of the project at root, as its build backend
+    does for a wheel, reusing the result cached in :data:`METADATA`
+    while its inputs are unchanged.
+    """
+    import build
+
+    try:
+        inputs = metadata_inputs(root)
+    except (OSError, subprocess.CalledProcessError):
+        inputs = None
+    cache_file = root / METADATA
+    with contextlib.suppress(OSError, ValueError, KeyError):
+        saved = json.loads(cache_file.read_text(encoding='utf-8'))
+        if inputs and saved['inputs'] == inputs:
+            return saved['metadata']
+    with tempfile.TemporaryDirectory() as tmp, bootstrap.write_pyproject(root):
+        info = build.ProjectBuilder(root).metadata_path(tmp)
+        metadata = pathlib.Path(info, 'METADATA').read_text(encoding='utf-8')
+    if inputs:
+        with contextlib.suppress(OSError):
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            data = dict(inputs=inputs, metadata=metadata)
+            cache_file.write_text(json.dumps(data), encoding='utf-8')
+    return metadata
+
+
+def doc_requirements(metadata: str) -> list[str]:
+    """
+    Select the requirements for the docs from a project's metadata:
+    those of the project and of its ``doc`` extra, for this interpreter.
+
+    >>> doc_requirements(
+    ...     'Name: my.pkg\\n'
+    ...     'Requires-Dist: attrs>=22\\n'
+    ...     'Requires-Dist: furo; extra == "doc"\\n'
+    ...     'Requires-Dist: pytest; extra == "test"\\n'
+    ...     'Requires-Dist: legacy; python_version < "3"\\n'
+    ... )
+    ['attrs>=22', 'furo']
+    """
+    selected = []
+    for spec in email.message_from_string(metadata).get_all('Requires-Dist') or []:
+        requirement = packaging.requirements.Requirement(spec)
+        marker, requirement.marker = requirement.marker, None
+        if marker is None or marker.evaluate(dict(extra='doc')):
+            selected.append(str(requirement))
+    return selected
+
+
+def project_requirements(root: pathlib.Path = pathlib.Path()) -> list[str]:
+    """
+    The requirements of the project at root and its ``doc`` extra, as
+    declared and as inferred from its imports.
+    """
+    return doc_requirements(built_metadata(root))
+
+
+def requirements(
+    root: pathlib.Path = pathlib.Path(),
+    static: bool = False,
+    mock: Iterable[str] = (),
+) -> list[str]:
+    """
+    Gather the requirements that determine the ``[doc]`` environment:
+    the project's requirements (see :func:`project_requirements`),
+    unless it's documented statically, without being imported, and
+    except those providing the mocked modules, the doc toolchain, and
+    the build backend that assembles the extra.
+    """
+    required = [] if static else project_requirements(root)
+    mocked = set(map(canonical, mock))
+    required = [
+        req for req in required if canonical(requirement_name(req)) not in mocked
+    ]
+    backend = f'coherent.build=={importlib.metadata.version("coherent.build")}'
+    return sorted({*required, *toolchain, backend})
+
+
+def namespaces(root: pathlib.Path = pathlib.Path()) -> set[str]:
+    """
+    The namespaces of the project's requirements, such as ``jaraco``
+    for ``jaraco.functools``.
+    """
+    names = map(requirement_name, project_requirements(root))
+    return {name.partition('.')[0] for name in names if '.' in name}
+
+
+LOCK = pathlib.Path('docs/requirements.lock')
+"""
+Pinned, hashed doc dependencies, relative to the project.
+"""
+
+
+def locked(root: pathlib.Path = pathlib.Path()) -> pathlib.Path | None:
+    lock = root / LOCK
+    return lock if lock.exists() else None
+
+
+def dependencies(
+    root: pathlib.Path = pathlib.Path(),
+    static: bool = False,
+    mock: Iterable[str] = (),
+) -> list[str]:
+    """
+    The inputs determining the project's doc dependencies: its lockfile
+    when present (and not documenting statically or mocking imports),
+    otherwise its requirements.
+    """
+    lock = None if static or mock else locked(root)
+    if lock:
+        return [lock.read_text(encoding='utf-8')]
+    return requirements(root, static=static, mock=mock)
+
+
+def pin(item: dict) -> str | None:
+    """
+    Render an item from a pip installation report as a hashed pin, or
+    None if it can't be pinned (such as an editable install).
+
+    >>> pin(dict(
+    ...     metadata=dict(name='Sphinx', version='7.2.6'),
+    ...     download_info=dict(archive_info=dict(hashes=dict(sha256='abc'))),
+    ... ))
+    'Sphinx==7.2.6 --hash=sha256:abc'
+    >>> pin(dict(
+    ...     metadata=dict(name='my.pkg', version='1.0'),
+    ...     download_info=dict(dir_info=dict(editable=True)),
+    ... ))
+    """
+    hashes = item['download_info'].get('archive_info', {}).get('hashes', {})
+    if not hashes:
+        return None
+    meta = item['metadata']
+    digests = ' '.join(f'--hash={alg}:{value}' for alg, value in hashes.items())
+    return f'{meta["name"]}=={meta["version"]} {digests}'
+
+
+def lock(root: pathlib.Path = pathlib.Path()) -> pathlib.Path:
+    """
+    Resolve the project's doc dependencies and write them, with exact
+    versions and hashes, to its lockfile.
+
+    The hashes are those of the distributions selected for this
+    interpreter and platform.
+    """
+    cmd = [sys.executable, '-m', 'pip', 'install', '--dry-run', '--quiet']
+    cmd += ['--ignore-installed', '--report', '-', '--editable', f'{root}[doc]']
+    report = json.loads(subprocess.check_output(cmd))
+    pins = sorted(filter(None, map(pin, report['install'])), key=str.lower)
+    target = root / LOCK
+    target.parent.mkdir(parents=True, exist_ok=True)
+    target.write_text(''.join(line + '\n' for line in pins), encoding='utf-8')
+    return target
+
+
+def key(requirements: list[str], python: str = sys.version) -> str:
+    """
+    Compute the cache key for an environment with requirements installed.
+
+    >>> key(['sphinx'], python='3.12.0') == key(['sphinx'], python='3.12.0')
+    True
+    >>> key(['sphinx'], python='3.12.0') == key(['sphinx'], python='3.13.0')
+    False
+    >>> key(['sphinx'], python='3.12.0') == key(['attrs', 'sphinx'], python='3.12.0')
+    False
+    """
+    return cache.digest(*requirements, python)
+
+
+def dependencies_key(
+    root: pathlib.Path = pathlib.Path(),
+    static: bool = False,
+    mock: Iterable[str] = (),
+) -> str:
+    """
+    Key identifying the doc dependency set of the project at root,
+    regardless of the project itself: the requirements installed
+    (including those inferred from its imports), or its lockfile.
+    """
+    return key(dependencies(root, static=static, mock=mock))
+
+
+def find_uv() -> str | None:
+    """
+    Locate the uv executable, if installed.
+    """
+    with contextlib.suppress(ImportError, FileNotFoundError):
+        import uv
+
+        return uv.find_uv_bin()
+    return shutil.which('uv')
+
+
+def wheelhouse() -> pathlib.Path:
+    """
+    The default local wheelhouse for offline installs.
+    """
+    return cache.root() / 'wheelhouse'
+
+
+def prefetch(target: pathlib.Path, root: pathlib.Path = pathlib.Path()) -> None:
+    """
+    Download the doc dependencies of the project at root (and their
+    dependencies) into the wheelhouse at target, exactly those pinned
+    in its lockfile when it has one.
+    """
+    cmd = [sys.executable, '-m', 'pip', 'download', '--dest', os.fspath(target)]
+    lock = locked(root)
+    if lock:
+        cmd += ['--no-deps', '--require-hashes', '--requirement', os.fspath(lock)]
+    else:
+        cmd += requirements(root)
+    subprocess.check_call(cmd)
+
+
+def install(
+    args,
+    target: pathlib.Path,
+    installer: str = 'uv',
+    wheelhouse: pathlib.Path | None = None,
+):
+    """
+    Install args into target with the installer, falling back to pip
+    if uv isn't available. With a wheelhouse, install only from it,
+    without consulting an index.
+
+    uv installs from its global cache using hardlinks.
+    """
+    uv = installer == 'uv' and find_uv()
+    if uv:
+        cmd = [uv, 'pip', 'install', '--quiet', '--python', sys.executable]
+        cmd += ['--link-mode', 'hardlink', '--target', os.fspath(target)]
+    else:
+        cmd = [sys.executable, '-m', 'pip', 'install', '--target', os.fspath(target)]
+    if wheelhouse:
+        cmd += ['--no-index', '--find-links', os.fspath(wheelhouse)]
+    env = dict(os.environ, PIP_QUIET='1')
+    subprocess.check_call(cmd + list(args), env=env)
+
+
+def store():
+    limit = int(os.environ.get('COHERENT_DOCS_ENV_CACHE_SIZE', DEFAULT_LIMIT))
+    return cache.Store('envs', limit=limit)
+
+
+def overlay(
+    package_name: str,
+    target: pathlib.Path,
+    root: pathlib.Path = pathlib.Path(),
+    version: str = '0',
+) -> pathlib.Path:
+    """
+    Expose the project at root as ``package_name`` under target, so
+    it's importable from there without being installed.
+
+    Minimal metadata (name and version only) is written alongside, so
+    :mod:`importlib.metadata` finds the project, but entry points and
+    other metadata aren't available.
+
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as tmp:
+    ...     target = overlay('my.pkg', pathlib.Path(tmp, 'overlay'), version='1.0')
+    ...     dist = importlib.metadata.PathDistribution(
+    ...         target / 'my_pkg-1.0.dist-info'
+    ...     )
+    ...     dist.name, dist.version
+    ('my.pkg', '1.0')
+    """
+    link = target.joinpath(*package_name.split('.'))
+    source = root.resolve()
+    if not (link.is_symlink() and link.resolve() == source):
+        shutil.rmtree(target, ignore_errors=True)
+        link.parent.mkdir(parents=True)
+        link.symlink_to(source, target_is_directory=True)
+    for stale in target.glob('*.dist-info'):
+        shutil.rmtree(stale)
+    dist_info = target / f'{re.sub(r"[-_.]+", "_", package_name)}-{version}.dist-info'
+    dist_info.mkdir()
+    metadata = f'Metadata-Version: 2.1\nName: {package_name}\nVersion: {version}\n'
+    (dist_info / 'METADATA').write_text(metadata, encoding='utf-8')
+    return target.resolve()
+
+
+def install_locked(lock: pathlib.Path, args, target: pathlib.Path, **kwargs):
+    """
+    Install the pinned dependencies from lock, then args without
+    resolving their dependencies.
+    """
+    pinned = ['--no-deps', '--require-hashes', '--requirement', os.fspath(lock)]
+    install(pinned, target, **kwargs)
+    if args:
+        install(['--no-deps', *args], target, **kwargs)
+
+
+@contextlib.contextmanager
+def load(
+    *args,
+    key: str,
+    refresh: bool = False,
+    installer: str = 'uv',
+    wheelhouse: pathlib.Path | None = None,
+    lock: pathlib.Path | None = None,
+):
+    """
+    Yield an environment with ``args`` installed, reusing the cached
+    environment for ``key`` unless ``refresh`` is requested.
+
+    With a lock, dependencies are installed from it without resolution.
+    The environment is protected from eviction while in use.
+    """
+    envs = store()
+    if refresh:
+        envs.remove(key)
+    kwargs = dict(installer=installer, wheelhouse=wheelhouse)
+    populate = (
+        functools.partial(install_locked, lock, args, **kwargs)
+        if lock
+        else functools.partial(install, args, **kwargs)
+    )
+    with envs.using(key):
+        yield envs.get(key) or envs.add(key, populate)
@@ -0,0 +1,207 @@
+"""
+A local cache of intersphinx inventories, shared across projects and
+builds.
+
+Also a Sphinx extension pointing ``intersphinx_mapping`` at the cached
+inventories. Seed the cache from files with
+``python -m coherent.docs.inventory URI FILE``.
+"""
+
+import argparse
+import ast
+import os
+import pathlib
+import shutil
+import time
+import urllib.request
+
+from . import cache
+
+DEFAULT_TTL = 7
+"""
+Days before a cached inventory is fetched again.
+"""
+
+
+def url(uri: str) -> str:
+    """
+    Resolve the inventory URL for a documentation URI.
+
+    >>> url('https://docs.python.org/3')
+    'https://docs.python.org/3/objects.inv'
+    >>> url('https://example.org/docs/objects.inv')
+    'https://example.org/docs/objects.inv'
+    """
+    return uri if uri.endswith('.inv') else uri.rstrip('/') + '/objects.inv'
+
+
+def is_remote(location: str) -> bool:
+    """
+    >>> is_remote('https://docs.python.org/3/objects.inv')
+    True
+    >>> is_remote('_inventories/python.inv')
+    False
+    """
+    return location.startswith(('http://', 'https://'))
+
+
+def cached(inventory_url: str) -> pathlib.Path:
+    return cache.root() / 'inventories' / f'{cache.digest(inventory_url)}.inv'
+
+
+def seed(uri: str, source: pathlib.Path) -> pathlib.Path:
+    target = cached(url(uri))
+    target.parent.mkdir(parents=True, exist_ok=True)
+    shutil.copyfile(source, target)
+    return target
+
+
+def fetch(inventory_url: str, target: pathlib.Path) -> None:
+    target.parent.mkdir(parents=True, exist_ok=True)
+    scratch = target.with_suffix(f'.{os.getpid()}')
+    with urllib.request.urlopen(inventory_url, timeout=30) as resp:
+        scratch.write_bytes(resp.read())
+    os.replace(scratch, target)
+
+
+def resolve(inventory_url: str, ttl: float, offline: bool) -> pathlib.Path | None:
+    """
+    Return the cached inventory for the URL, fetching it if it's missing
+    or older than ``ttl`` days (unless offline). A stale inventory is
+    used when it can't be refreshed.
+    """
+    target = cached(inventory_url)
+    exists = target.exists()
+    if exists and (offline or time.time() - target.stat().st_mtime < ttl * 86400):
+        return target
+    if offline:
+        return None
+    try:
+        fetch(inventory_url, target)
+    except OSError:
+        return target if exists else None
+    return target
+
+
+def localize(mapping: dict, ttl: float, offline: bool, warn=print) -> dict:
+    """
+    Replace remote inventory locations in an intersphinx mapping (each
+    of them, where alternatives are given) with the cached inventories,
+    dropping those that can't be resolved and entries left with none.
+
+    >>> import tempfile, unittest.mock
+    >>> tmp = tempfile.TemporaryDirectory()
+    >>> env = unittest.mock.patch.dict(os.environ, COHERENT_DOCS_CACHE=tmp.name)
+    >>> _ = env.start()
+    >>> localize({'local': ('https://example.org', 'local.inv')}, 7, True)
+    {'local': ('https://example.org', 'local.inv')}
+    >>> localize({'alt': ('https://example.org', (None, 'alt.inv'))}, 7, True)
+    No cached inventory for alt (https://example.org/objects.inv); skipping.
+    {'alt': ('https://example.org', ('alt.inv',))}
+    >>> localize({'gone': ('https://example.org', None)}, 7, True, warn=len)
+    {}
+
+    >>> source = pathlib.Path(tmp.name, 'objects.inv')
+    >>> _ = source.write_bytes(b'')
+    >>> _ = seed('https://example.org', source)
+    >>> _, (cached, local) = localize(
+    ...     {'alt': ('https://example.org', (None, 'alt.inv'))}, 7, True
+    ... )['alt']
+    >>> pathlib.Path(cached).is_relative_to(tmp.name), local
+    (True, 'alt.inv')
+    >>> _ = env.stop()
+    >>> tmp.cleanup()
+    """
+    result = {}
+    for name, value in mapping.items():
+        uri, location = value if isinstance(value, (tuple, list)) else (None, None)
+        if uri is None:
+            result[name] = value
+            continue
+        alternatives = isinstance(location, (tuple, list))
+        found = []
+        for alternative in location if alternatives else [location]:
+            if alternative is None or is_remote(alternative):
+                inventory_url = alternative or url(uri)
+                local = resolve(inventory_url, ttl, offline)
+                if local is None:
+                    warn(f'No cached inventory for {name} ({inventory_url}); skipping.')
+                    continue
+                alternative = os.fspath(local)
+            found.append(alternative)
+        if found:
+            result[name] = (uri, tuple(found) if alternatives else found[0])
+    return result
+
+
+def configured(source: str) -> dict:
+    """
+    Read a literal ``intersphinx_mapping`` from the source of a Sphinx
+    configuration, without executing it.
+
+    >>> configured("intersphinx_mapping = {'py': ('https://docs.python.org/3', None)}")
+    {'py': ('https://docs.python.org/3', None)}
+    >>> configured("intersphinx_mapping = dict(python=PYTHON)")
+    {}
+    """
+    mapping = {}
+    for node in ast.parse(source).body:
+        if isinstance(node, ast.Assign):
+            targets = node.targets
+        elif isinstance(node, ast.AnnAssign) and node.value:
+            targets = [node.target]
+        else:
+            continue
+        names = {getattr(target, 'id', None) for target in targets}
+        if 'intersphinx_mapping' not in names:
+            continue
+        try:
+            mapping = ast.literal_eval(node.value)
+        except ValueError:
+            mapping = {}
+    return mapping
+
+
+def prefetch(conf: pathlib.Path, ttl: float) -> dict:
+    """
+    Fetch the inventories configured in conf into the cache ahead of a
+    build, returning the localized mapping.
+    """
+    mapping = configured(conf.read_text(encoding='utf-8'))
+    return localize(mapping, ttl, offline=False, warn=lambda message: None)
+
+
+def _on_config_inited(app, config):
+    from sphinx.util import logging
+
+    mapping = getattr(config, 'intersphinx_mapping', None)
+    if not mapping:
+        return
+    config.intersphinx_mapping = localize(
+        mapping,
+        ttl=config.coherent_docs_inventory_ttl,
+        offline=config.coherent_docs_offline,
+        warn=logging.getLogger(__name__).warning,
+    )
+
+
+def setup(app):
+    app.add_config_value('coherent_docs_inventory_ttl', DEFAULT_TTL, '')
+    app.add_config_value('coherent_docs_offline', False, '')
+    # ahead of intersphinx's own normalization
+    app.connect('config-inited', _on_config_inited, priority=400)
+    return dict(parallel_read_safe=True, parallel_write_safe=True)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        prog='coherent.docs.inventory',
+        description='Seed the inventory cache from a local file.',
+    )
+    parser.add_argument('uri', help='Documentation URI, as in intersphinx_mapping.')
+    parser.add_argument('file', type=pathlib.Path)
+    options = parser.parse_args(args)
+    print(f'Cached {options.file} as {seed(options.uri, options.file)}')
+
+
+__name__ == '__main__' and main()
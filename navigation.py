@@ -0,0 +1,37 @@
+"""
+A Sphinx extension keeping the site navigation rendered into each page
+to the branch leading to that page.
+
+Furo renders the whole toctree into every page's sidebar, ignoring the
+``:maxdepth:`` of the toctrees, so for a package with many modules the
+navigation (and the time to write it) grows with the module count on
+every page. Have the ``toctree`` of each page's context collapse the
+branches not containing the page, before furo renders its sidebar.
+"""
+
+
+def collapsed(toctree):
+    """
+    Wrap a page's ``toctree`` to collapse the branches not containing
+    the page, regardless of what the theme asks for.
+
+    >>> render = collapsed(lambda **kwargs: kwargs)
+    >>> render(collapse=False, maxdepth=-1)
+    {'collapse': True, 'maxdepth': -1}
+    """
+
+    def render(**kwargs):
+        return toctree(**dict(kwargs, collapse=True))
+
+    return render
+
+
+def _on_html_page_context(app, pagename, templatename, context, doctree):
+    if 'toctree' in context:
+        context['toctree'] = collapsed(context['toctree'])
+
+
+def setup(app):
+    # ahead of the theme's handler rendering the navigation
+    app.connect('html-page-context', _on_html_page_context, priority=400)
+    return dict(parallel_read_safe=True, parallel_write_safe=True)
@@ -0,0 +1,179 @@
+"""
+Profile a docs build.
+
+A Sphinx extension, loaded by :mod:`coherent.docs.runner` when profiling,
+attributing wall time to the extensions handling Sphinx events and
+running directives, and to the theme's page rendering. The runner
+profiles the whole build with :mod:`cProfile` alongside.
+"""
+
+import cProfile
+import functools
+import pathlib
+import pstats
+import sys
+import time
+
+
+class Costs:
+    """
+    Accumulate the calls to and inclusive time spent in named activities.
+
+    >>> costs = Costs()
+    >>> costs.add(('event', 'html-page-context', 'furo'), 0.5)
+    >>> costs.add(('event', 'html-page-context', 'furo'), 0.25)
+    >>> costs.spent
+    {('event', 'html-page-context', 'furo'): [2, 0.75]}
+    """
+
+    current: 'Costs | None' = None
+
+    def __init__(self):
+        self.spent = {}
+        self.extensions = ()
+        self.theme = ''
+
+    def add(self, key, duration: float) -> None:
+        calls, total = self.spent.get(key, (0, 0.0))
+        self.spent[key] = [calls + 1, total + duration]
+
+    def owner(self, module: str) -> str:
+        """
+        Resolve the loaded extension a module belongs to.
+
+        >>> costs = Costs()
+        >>> costs.extensions = ('sphinx.ext.autodoc', 'furo')
+        >>> costs.owner('sphinx.ext.autodoc.directive')
+        'sphinx.ext.autodoc'
+        >>> costs.owner('sphinx.builders.html')
+        'sphinx.builders.html'
+        """
+        matches = [
+            name
+            for name in self.extensions
+            if module == name or module.startswith(name + '.')
+        ]
+        return max(matches, key=len, default=module)
+
+    def by_extension(self) -> dict[str, dict[str, list]]:
+        """
+        Group the costs by the extension responsible, slowest first.
+        """
+        grouped: dict[str, dict[str, list]] = {}
+        for (kind, name, module), (calls, total) in self.spent.items():
+            activities = grouped.setdefault(self.owner(module), {})
+            activities[f'{kind} {name}'] = [calls, total]
+        return dict(
+            sorted(
+                grouped.items(),
+                key=lambda item: -sum(total for _, total in item[1].values()),
+            )
+        )
+
+
+def _timed(func, key):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        began = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            if Costs.current:
+                Costs.current.add(key(*args, **kwargs), time.perf_counter() - began)
+
+    wrapper.timed = True
+    return wrapper
+
+
+def _owner_of(func) -> str:
+    return getattr(func, '__module__', None) or type(func).__module__
+
+
+def _timed_connect(connect):
+    @functools.wraps(connect)
+    def wrapper(self, name, callback, priority):
+        meta = ('event', name, _owner_of(callback))
+        return connect(self, name, _timed(callback, lambda *args: meta), priority)
+
+    wrapper.timed = True
+    return wrapper
+
+
+def _timed_directive(cls):
+    def key(self):
+        return ('directive', self.name, cls.__module__)
+
+    namespace = dict(run=_timed(cls.run, key), __module__=cls.__module__)
+    return type(cls.__name__, (cls,), namespace)
+
+
+def _timed_add_directive(add_directive):
+    @functools.wraps(add_directive)
+    def wrapper(self, name, cls, *args, **kwargs):
+        if hasattr(cls, 'run'):
+            cls = _timed_directive(cls)
+        return add_directive(self, name, cls, *args, **kwargs)
+
+    wrapper.timed = True
+    return wrapper
+
+
+def _on_builder_inited(app):
+    costs = Costs.current = Costs()
+    costs.extensions = tuple(app.extensions)
+    costs.theme = app.config.html_theme or ''
+
+
+def _page_key(self, pagename, *args, **kwargs):
+    theme = Costs.current.theme if Costs.current else ''
+    return ('render', 'pages', theme or 'sphinx.builders.html')
+
+
+def setup(app):
+    from sphinx.application import Sphinx
+    from sphinx.builders.html import StandaloneHTMLBuilder
+    from sphinx.events import EventManager
+
+    app.connect('builder-inited', _on_builder_inited)
+    patches = [
+        (EventManager, 'connect', _timed_connect),
+        (Sphinx, 'add_directive', _timed_add_directive),
+        (StandaloneHTMLBuilder, 'handle_page', lambda f: _timed(f, _page_key)),
+    ]
+    for owner, name, patch in patches:
+        if not getattr(getattr(owner, name), 'timed', False):
+            setattr(owner, name, patch(getattr(owner, name)))
+    return dict(parallel_read_safe=True, parallel_write_safe=True)
+
+
+def summarize(stats: pstats.Stats, costs: Costs | None, top: int = 15) -> str:
+    """
+    Summarize the costs by extension and the slowest functions.
+    """
+    lines = ['Time by extension (inclusive):']
+    for extension, activities in (costs.by_extension() if costs else {}).items():
+        total = sum(spent for _, spent in activities.values())
+        lines.append(f'  {extension:<40} {total:8.2f}s')
+        for activity, (calls, spent) in sorted(
+            activities.items(), key=lambda item: -item[1][1]
+        ):
+            lines.append(f'    {activity:<38} {spent:8.2f}s  {calls:>6} calls')
+    lines.append(f'Slowest functions (cumulative, top {top}):')
+    ranked = sorted(stats.stats.items(), key=lambda item: -item[1][3])[:top]
+    for (file, line, func), (_, calls, _, cumulative, _) in ranked:
+        lines.append(f'  {cumulative:8.2f}s  {calls:>8}  {func} ({file}:{line})')
+    return '\n'.join(lines) + '\n'
+
+
+def report(profiler: cProfile.Profile, path: pathlib.Path) -> pathlib.Path:
+    """
+    Save the profile to path and a summary alongside, printing the
+    summary. Return the summary's path.
+    """
+    path.parent.mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(path)
+    summary = summarize(pstats.Stats(profiler), Costs.current)
+    target = path.with_suffix('.txt')
+    target.write_text(summary, encoding='utf-8')
+    sys.stdout.write(summary)
+    return target
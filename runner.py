@@ -0,0 +1,153 @@
+"""
+Run a Sphinx build, either in the current process or as
+``python -m coherent.docs.runner``.
+"""
+
+import argparse
+import contextlib
+import cProfile
+import json
+import os
+import pathlib
+import site
+import sys
+
+
+EXTENSIONS = (
+    'coherent.docs.timing',
+    'coherent.docs.inventory',
+    'coherent.docs.autodoc',
+    'coherent.docs.navigation',
+)
+"""
+Extensions loaded into every build, ahead of the project's own.
+"""
+
+
+@contextlib.contextmanager
+def extended(names=EXTENSIONS):
+    """
+    Have Sphinx load the named extensions along with its built-in ones,
+    so they're set up before the project's configuration is applied.
+    """
+    from sphinx import application
+
+    orig = application.builtin_extensions
+    application.builtin_extensions = (*orig, *names)
+    try:
+        yield
+    finally:
+        application.builtin_extensions = orig
+
+
+def build(
+    srcdir: os.PathLike,
+    outdir: os.PathLike,
+    doctreedir: os.PathLike,
+    *,
+    builder: str = 'html',
+    jobs: int = 1,
+    overrides: dict | None = None,
+    profile: os.PathLike | None = None,
+) -> int:
+    """
+    Build the docs in srcdir, returning the Sphinx status code.
+
+    ``overrides`` replace values from the project's configuration.
+
+    With ``profile``, save a profile of the build there, with a summary
+    of the time spent by each extension (see
+    :mod:`coherent.docs.profiling`).
+
+    Sphinx is imported here rather than with this module, so that an
+    in-process build uses the Sphinx on the path set up by :func:`on_path`.
+    """
+    from sphinx.application import Sphinx
+    from sphinx.errors import SphinxError
+    from sphinx.util.docutils import docutils_namespace, patch_docutils
+
+    names = (*EXTENSIONS, 'coherent.docs.profiling') if profile else EXTENSIONS
+    profiler = cProfile.Profile() if profile else contextlib.nullcontext()
+    with patch_docutils(srcdir), docutils_namespace(), extended(names):
+        try:
+            with profiler:
+                app = Sphinx(
+                    srcdir=srcdir,
+                    confdir=srcdir,
+                    outdir=outdir,
+                    doctreedir=doctreedir,
+                    buildername=builder,
+                    confoverrides=dict(overrides or {}),
+                    parallel=jobs,
+                )
+                app.build()
+        except SphinxError as exc:
+            print(f'{type(exc).__name__}: {exc}', file=sys.stderr)
+            return 2
+    if profile:
+        from . import profiling
+
+        profiling.report(profiler, pathlib.Path(profile))
+    return app.statuscode
+
+
+def _is_under(module, root: pathlib.Path) -> bool:
+    file = getattr(module, '__file__', None)
+    return bool(file) and pathlib.Path(file).resolve().is_relative_to(root)
+
+
+@contextlib.contextmanager
+def on_path(*paths: os.PathLike, root: pathlib.Path = pathlib.Path()):
+    """
+    Make the paths (such as an environment's home) importable, in order,
+    for an in-process build, then forget them and any modules imported
+    from the project at root, so that a subsequent build sees fresh
+    sources.
+    """
+    saved = sys.path[:]
+    sys.path[:0] = map(os.fspath, paths)
+    for path in paths:
+        site.addsitedir(os.fspath(path))
+    try:
+        yield
+    finally:
+        sys.path[:] = saved
+        root = root.resolve()
+        for name, module in list(sys.modules.items()):
+            if _is_under(module, root):
+                del sys.modules[name]
+
+
+def define(spec: str) -> tuple[str, object]:
+    """
+    Parse a ``name=value`` override, decoding JSON values.
+
+    >>> define('coherent_docs_offline=true')
+    ('coherent_docs_offline', True)
+    >>> define('coherent_docs_timings=build/timings.json')
+    ('coherent_docs_timings', 'build/timings.json')
+    """
+    name, _, value = spec.partition('=')
+    try:
+        return name, json.loads(value)
+    except ValueError:
+        return name, value
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog='coherent.docs.runner')
+    parser.add_argument('srcdir')
+    parser.add_argument('outdir')
+    parser.add_argument('-d', dest='doctreedir', required=True)
+    parser.add_argument('-b', dest='builder', default='html')
+    parser.add_argument('-j', dest='jobs', type=int, default=1)
+    parser.add_argument(
+        '-D', dest='overrides', type=define, action='append', default=[]
+    )
+    parser.add_argument('--profile', type=pathlib.Path)
+    options = parser.parse_args(args)
+    options.overrides = dict(options.overrides)
+    raise SystemExit(build(**vars(options)))
+
+
+__name__ == '__main__' and main()
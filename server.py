@@ -0,0 +1,242 @@
+"""
+A local build server holding warm Sphinx processes per environment.
+
+Start it with ``python -m coherent.docs.server``; while it's running,
+builds are dispatched to it. Each environment gets one or more zygote
+processes that pre-import Sphinx and the doc toolchain, then fork a
+fresh child for each build.
+"""
+
+import argparse
+import contextlib
+import importlib
+import json
+import os
+import pathlib
+import site
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import traceback
+
+from . import cache
+
+PRELOAD = [
+    'docutils.core',
+    'sphinx.application',
+    'sphinx.ext.autodoc',
+    'sphinx.ext.intersphinx',
+    'furo',
+    'jaraco.packaging.sphinx',
+]
+"""
+Modules each zygote imports before it's ready for builds.
+"""
+
+
+def address() -> pathlib.Path:
+    return cache.root() / 'server.sock'
+
+
+def dispatch(home: pathlib.Path, build: dict, path=()) -> int | None:
+    """
+    Run the build on the server with this process's output streams,
+    returning its status, or None if no server is running (or it
+    couldn't run the build).
+
+    ``path`` entries are importable ahead of the environment at home.
+    """
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    sock = socket.socket(socket.AF_UNIX)
+    try:
+        sock.connect(os.fspath(address()))
+    except OSError:
+        sock.close()
+        return None
+    request = dict(
+        home=os.fspath(home),
+        path=list(map(os.fspath, path)),
+        cwd=os.getcwd(),
+        build=build,
+    )
+    sys.stdout.flush()
+    sys.stderr.flush()
+    with sock:
+        streams = [sys.stdout.fileno(), sys.stderr.fileno()]
+        try:
+            socket.send_fds(sock, [json.dumps(request).encode()], streams)
+            reply = sock.makefile().read()
+        except OSError:
+            return None
+    return status(reply)
+
+
+def status(reply: str) -> int | None:
+    """
+    Decode the server's reply, or None if it's empty or invalid (as when
+    the server or its zygote died).
+
+    >>> status('0'), status(''), status('null'), status('{')
+    (0, None, None, None)
+    """
+    with contextlib.suppress(ValueError):
+        code = json.loads(reply)
+        return code if isinstance(code, int) else None
+    return None
+
+
+class Zygote:
+    """
+    A process with the environment at home imported, forking a child
+    for each build.
+    """
+
+    def __init__(self, home: str):
+        self.sock, theirs = socket.socketpair()
+        cmd = [sys.executable, '-m', 'coherent.docs.server', '--zygote', home]
+        cmd += ['--fd', str(theirs.fileno())]
+        self.proc = subprocess.Popen(cmd, pass_fds=[theirs.fileno()])
+        theirs.close()
+        self.replies = self.sock.makefile()
+
+    def run(self, request: dict, streams: list[int]) -> int | None:
+        """
+        Run the build, returning its status, or None if the zygote died.
+        """
+        try:
+            socket.send_fds(self.sock, [json.dumps(request).encode()], streams)
+            return status(self.replies.readline())
+        except OSError:
+            return None
+
+    @property
+    def alive(self):
+        return self.proc.poll() is None
+
+    @staticmethod
+    def build(request: dict, streams: list[int], runner) -> int:
+        """
+        In the forked child, run the build against the client's streams.
+        """
+        os.dup2(streams[0], 1)
+        os.dup2(streams[1], 2)
+        try:
+            os.chdir(request['cwd'])
+            sys.path[:0] = request['path']
+            return runner.build(**request['build'])
+        except BaseException:
+            traceback.print_exc()
+            return 1
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+
+    @staticmethod
+    def serve(home: str, fd: int):
+        """
+        Zygote main loop: preload, then fork a build per request.
+        """
+        sys.path.insert(0, home)
+        site.addsitedir(home)
+        for name in PRELOAD:
+            with contextlib.suppress(ImportError):
+                importlib.import_module(name)
+        from . import runner
+
+        sock = socket.socket(fileno=fd)
+        while True:
+            msg, streams, _, _ = socket.recv_fds(sock, 2**16, 2)
+            if not msg:
+                break
+            request = json.loads(msg)
+            sys.stdout.flush()
+            sys.stderr.flush()
+            pid = os.fork()
+            if not pid:
+                os._exit(Zygote.build(request, streams, runner))
+            for stream in streams:
+                os.close(stream)
+            _, status = os.waitpid(pid, 0)
+            code = os.waitstatus_to_exitcode(status)
+            sock.sendall(json.dumps(code).encode() + b'\n')
+
+
+class Pool:
+    """
+    Idle zygotes by environment.
+    """
+
+    def __init__(self):
+        self.idle: dict[str, list[Zygote]] = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, home: str) -> Zygote:
+        with self.lock:
+            zygotes = self.idle.setdefault(home, [])
+            while zygotes:
+                zygote = zygotes.pop()
+                if zygote.alive:
+                    return zygote
+        return Zygote(home)
+
+    def release(self, home: str, zygote: Zygote):
+        with self.lock:
+            self.idle[home].append(zygote)
+
+    def run(self, request: dict, streams: list[int]) -> int | None:
+        zygote = self.acquire(request['home'])
+        code = zygote.run(request, streams)
+        if code is None:
+            zygote.proc.kill()
+        else:
+            self.release(request['home'], zygote)
+        return code
+
+
+class Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        msg, streams, _, _ = socket.recv_fds(self.request, 2**16, 2)
+        try:
+            code = self.server.pool.run(json.loads(msg), streams)
+        except Exception:
+            traceback.print_exc()
+            code = None
+        finally:
+            for stream in streams:
+                os.close(stream)
+        self.request.sendall(json.dumps(code).encode())
+
+
+class Server(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path: pathlib.Path):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.unlink(missing_ok=True)
+        # only the user may connect to the socket and run builds
+        previous = os.umask(0o177)
+        try:
+            super().__init__(os.fspath(path), Handler)
+        finally:
+            os.umask(previous)
+        self.pool = Pool()
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(prog='coherent.docs.server')
+    parser.add_argument('--zygote', metavar='HOME', help=argparse.SUPPRESS)
+    parser.add_argument('--fd', type=int, help=argparse.SUPPRESS)
+    options = parser.parse_args(args)
+    if options.zygote:
+        return Zygote.serve(options.zygote, options.fd)
+    with Server(address()) as server:
+        print(f'Serving builds on {address()}')
+        with contextlib.suppress(KeyboardInterrupt):
+            server.serve_forever()
+    address().unlink(missing_ok=True)
+
+
+__name__ == '__main__' and main()
@@ -0,0 +1,348 @@
+"""
+Document modules from their source, without importing them.
+
+Signatures, docstrings and class hierarchies are read with :mod:`ast`
+and rendered with the Python domain's directives, preferring the
+declarations in a ``.pyi`` stub alongside a module when present.
+"""
+
+import ast
+import copy
+import itertools
+import pathlib
+import textwrap
+from collections.abc import Iterator
+
+VALUE_LIMIT = 60
+"""
+Longest value rendered for module data and class attributes.
+"""
+
+
+def source_path(
+    package_name: str, module: str, root: pathlib.Path = pathlib.Path()
+) -> pathlib.Path:
+    """
+    Locate the source of a module in a package using the essential
+    layout.
+
+    >>> source_path('my.pkg', 'my.pkg').as_posix()
+    '__init__.py'
+    >>> source_path('my.pkg', 'my.pkg.mod').as_posix()
+    'mod.py'
+    """
+    parts = module.removeprefix(package_name).lstrip('.').split('.')
+    path = root.joinpath(*filter(None, parts))
+    package = path / '__init__.py'
+    is_package = module == package_name or package.exists()
+    return package if is_package else path.with_suffix('.py')
+
+
+def docstrings(tree: ast.Module) -> dict[str, str]:
+    """
+    Gather the docstrings in a module by qualified name (the module's
+    own under the empty name).
+
+    >>> source = '"Mod."\\nclass A:\\n    def f(self):\\n        "F."'
+    >>> docs = docstrings(ast.parse(source))
+    >>> docs['A.f'], docs['']
+    ('F.', 'Mod.')
+
+    A property's setter and deleter keep the getter's docstring.
+
+    >>> source = (
+    ...     'class A:\\n'
+    ...     '    @property\\n'
+    ...     '    def p(self):\\n'
+    ...     '        "P."\\n'
+    ...     '    @p.setter\\n'
+    ...     '    def p(self, value): pass\\n'
+    ... )
+    >>> docstrings(ast.parse(source))['A.p']
+    'P.'
+    """
+    found = {'': ast.get_docstring(tree)}
+
+    def visit(body, prefix):
+        for node in body:
+            defines = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
+            if not isinstance(node, defines):
+                continue
+            if not decorators(node) & {'setter', 'deleter'}:
+                found[prefix + node.name] = ast.get_docstring(node)
+            if isinstance(node, ast.ClassDef):
+                visit(node.body, f'{prefix}{node.name}.')
+
+    visit(tree.body, '')
+    return {name: doc for name, doc in found.items() if doc}
+
+
+def exported(tree: ast.Module) -> list[str] | None:
+    """
+    The names in a literal ``__all__``, if declared.
+
+    >>> exported(ast.parse('__all__ = ["a", "b"]'))
+    ['a', 'b']
+    >>> exported(ast.parse('x = 1')) is None
+    True
+    """
+    for node in tree.body:
+        if (
+            isinstance(node, ast.Assign)
+            and any(getattr(target, 'id', None) == '__all__' for target in node.targets)
+        ):
+            try:
+                return list(ast.literal_eval(node.value))
+            except ValueError:
+                return None
+    return None
+
+
+def imports(tree: ast.Module) -> set[str]:
+    """
+    The modules imported absolutely when the module is, excluding those
+    in functions, classes and ``if TYPE_CHECKING`` blocks.
+
+    >>> source = '\\n'.join([
+    ...     'import a.b', 'from c import d', 'from . import e',
+    ...     'try:', '    import f', 'except ImportError:', '    pass',
+    ...     'if TYPE_CHECKING:', '    import g', 'def h():', '    import i',
+    ... ])
+    >>> sorted(imports(ast.parse(source)))
+    ['a.b', 'c', 'f']
+    """
+    found = set()
+
+    def visit(node):
+        if isinstance(node, ast.Import):
+            found.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and not node.level:
+            found.add(node.module)
+        elif isinstance(node, ast.If) and 'TYPE_CHECKING' in ast.unparse(node.test):
+            list(map(visit, node.orelse))
+        elif not isinstance(node, scopes):
+            list(map(visit, ast.iter_child_nodes(node)))
+
+    scopes = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef, ast.Lambda)
+    visit(tree)
+    return found
+
+
+def is_public(name: str, names: list[str] | None = None) -> bool:
+    return name in names if names is not None else not name.startswith('_')
+
+
+def decorators(node) -> set[str]:
+    return {
+        ast.unparse(getattr(decorator, 'func', decorator)).rpartition('.')[2]
+        for decorator in node.decorator_list
+    }
+
+
+def signature(node, bound: bool = False) -> str:
+    """
+    Render the signature of a function, without its first parameter if
+    bound.
+
+    >>> tree = ast.parse('def f(self, a: int, b=1, *args) -> str: pass')
+    >>> signature(tree.body[0], bound=True)
+    '(a: int, b=1, *args) -> str'
+    """
+    args = copy.copy(node.args)
+    if bound and args.posonlyargs:
+        args.posonlyargs = args.posonlyargs[1:]
+    elif bound and args.args:
+        args.args = args.args[1:]
+    returns = f' -> {ast.unparse(node.returns)}' if node.returns else ''
+    return f'({ast.unparse(args)}){returns}'
+
+
+def directive(
+    kind: str,
+    signatures: list[str],
+    doc: str | None,
+    options: dict[str, str] | None = None,
+) -> list[str]:
+    """
+    Render a Python domain directive.
+
+    >>> print('\\n'.join(directive('function', ['f(a)', 'f(a, b)'], 'Do f.')))
+    .. py:function:: f(a)
+                     f(a, b)
+    <BLANKLINE>
+       Do f.
+    <BLANKLINE>
+    """
+    head = f'.. py:{kind}:: '
+    lines = [head + signatures[0]]
+    lines += [' ' * len(head) + sig for sig in signatures[1:]]
+    lines += [
+        f'   :{name}: {value}'.rstrip() for name, value in (options or {}).items()
+    ]
+    lines.append('')
+    if doc:
+        lines += [textwrap.indent(doc, '   '), '']
+    return lines
+
+
+def indented(lines: list[str]) -> list[str]:
+    return [textwrap.indent(line, '   ') for line in lines]
+
+
+def short(node) -> str | None:
+    value = ast.unparse(node) if node else None
+    return value if value and len(value) <= VALUE_LIMIT else None
+
+
+def assignments(body) -> Iterator[tuple]:
+    """
+    Yield the name, annotation, value and docstring of the simple
+    assignments in body.
+    """
+    for node, following in itertools.pairwise([*body, None]):
+        if isinstance(node, ast.AnnAssign) and isinstance(node.target, ast.Name):
+            name, annotation = node.target.id, node.annotation
+        elif (
+            isinstance(node, ast.Assign)
+            and len(node.targets) == 1
+            and isinstance(node.targets[0], ast.Name)
+        ):
+            name, annotation = node.targets[0].id, None
+        else:
+            continue
+        doc = (
+            following.value.value
+            if isinstance(following, ast.Expr)
+            and isinstance(following.value, ast.Constant)
+            and isinstance(following.value.value, str)
+            else None
+        )
+        yield name, annotation, node.value, doc and textwrap.dedent(doc).strip()
+
+
+def functions(body) -> Iterator[tuple[str, list]]:
+    """
+    Yield each function in body with its declarations, preferring any
+    overloads to the implementation. A property is declared by its
+    getter alone.
+
+    >>> source = '\\n'.join([
+    ...     '@property', 'def x(self): pass',
+    ...     '@x.setter', 'def x(self, value): pass',
+    ...     '@x.deleter', 'def x(self): pass',
+    ... ])
+    >>> [(name, len(nodes)) for name, nodes in functions(ast.parse(source).body)]
+    [('x', 1)]
+    >>> decorators(dict(functions(ast.parse(source).body))['x'][0])
+    {'property'}
+    """
+    defs = (
+        node
+        for node in body
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef))
+        and not decorators(node) & {'setter', 'deleter'}
+    )
+    for name, group in itertools.groupby(defs, key=lambda node: node.name):
+        nodes = list(group)
+        overloads = [node for node in nodes if 'overload' in decorators(node)]
+        yield name, overloads or nodes[-1:]
+
+
+def document_function(nodes, doc, qualname, method=False) -> list[str]:
+    marks = decorators(nodes[0])
+    if method and marks & {'property', 'cached_property'}:
+        returns = nodes[0].returns
+        options = {'type': ast.unparse(returns)} if returns else {}
+        return directive('property', [qualname.rpartition('.')[2]], doc, options)
+    bound = method and 'staticmethod' not in marks
+    name = qualname.rpartition('.')[2]
+    signatures = [name + signature(node, bound) for node in nodes]
+    options = {
+        option: ''
+        for option, present in dict(
+            staticmethod=method and 'staticmethod' in marks,
+            classmethod=method and 'classmethod' in marks,
+            abstractmethod='abstractmethod' in marks,
+            **{'async': isinstance(nodes[0], ast.AsyncFunctionDef)},
+        ).items()
+        if present
+    }
+    return directive('method' if method else 'function', signatures, doc, options)
+
+
+def bases(node: ast.ClassDef) -> list[str]:
+    """
+    The names of the classes node derives from, without any generic
+    parameters.
+
+    >>> bases(ast.parse('class A(abc.ABC, Generic[T], object): pass').body[0])
+    ['abc.ABC', 'Generic']
+    """
+    names = (
+        ast.unparse(base.value if isinstance(base, ast.Subscript) else base)
+        for base in node.bases
+    )
+    return [name for name in names if name != 'object']
+
+
+def document_class(node: ast.ClassDef, docs, qualname) -> list[str]:
+    init = dict(functions(node.body)).get('__init__')
+    args = signature(init[-1], bound=True).partition(' -> ')[0] if init else ''
+    lines = directive('class', [node.name + args], None)
+    inherits = ', '.join(f':py:class:`{name}`' for name in bases(node))
+    body = [f'Bases: {inherits}', ''] if inherits else []
+    if docs.get(qualname):
+        body += [docs[qualname], '']
+    body += document_body(node.body, docs, f'{qualname}.', method=True)
+    return lines + indented(body)
+
+
+def document_body(body, docs, prefix, names=None, method=False) -> list[str]:
+    lines = []
+    data = 'attribute' if method else 'data'
+    for name, annotation, value, doc in assignments(body):
+        if is_public(name, names) and (annotation or doc):
+            options = dict(type=short(annotation), value=short(value))
+            options = {key: value for key, value in options.items() if value}
+            lines += directive(data, [name], doc, options)
+    for name, nodes in functions(body):
+        if is_public(name, names):
+            qualname = prefix + name
+            lines += document_function(nodes, docs.get(qualname), qualname, method)
+    for node in body:
+        if isinstance(node, ast.ClassDef) and is_public(node.name, names):
+            lines += document_class(node, docs, prefix + node.name)
+    return lines
+
+
+def document(module: str, path: pathlib.Path) -> str:
+    """
+    Generate the reStructuredText documenting the module at path, as
+    ``automodule`` would without importing it.
+
+    >>> import tempfile
+    >>> with tempfile.TemporaryDirectory() as tmp:
+    ...     path = pathlib.Path(tmp, 'mod.py')
+    ...     _ = path.write_text('"The mod."\\ndef f(a, b=1):\\n    "Do f."\\n')
+    ...     print(document('my.mod', path))
+    <BLANKLINE>
+    .. py:module:: my.mod
+    <BLANKLINE>
+    The mod.
+    <BLANKLINE>
+    .. py:function:: f(a, b=1)
+    <BLANKLINE>
+       Do f.
+    <BLANKLINE>
+    """
+    tree = ast.parse(path.read_bytes(), filename=str(path))
+    docs = docstrings(tree)
+    stub = path.with_suffix('.pyi')
+    if stub.exists():
+        tree = ast.parse(stub.read_bytes(), filename=str(stub))
+        docs = {**docstrings(tree), **docs}
+    lines = ['', f'.. py:module:: {module}', '']
+    if docs.get(''):
+        lines += [docs[''], '']
+    lines += document_body(tree.body, docs, '', exported(tree))
+    return '\n'.join(lines)
@@ -0,0 +1,141 @@
+"""
+Time the phases of a docs build.
+
+Also a Sphinx extension timing the read, resolve and write phases of
+the build and saving them to ``coherent_docs_timings``.
+"""
+
+import contextlib
+import functools
+import json
+import pathlib
+import time
+
+
+class Timings:
+    """
+    Record the start (epoch seconds) and duration of named phases.
+
+    >>> timings = Timings()
+    >>> timings.record('discovery', start=0.0, duration=0.25)
+    >>> timings.record('sphinx', start=0.25, duration=1.5)
+    >>> timings.summary()
+    'discovery 0.25s, sphinx 1.50s (total 1.75s)'
+    """
+
+    def __init__(self, phases=()):
+        self.phases = list(phases)
+
+    def record(self, name: str, start: float, duration: float) -> None:
+        self.phases.append(dict(name=name, start=start, duration=duration))
+
+    @contextlib.contextmanager
+    def phase(self, name: str):
+        start = time.time()
+        began = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, start, time.perf_counter() - began)
+
+    @property
+    def total(self) -> float:
+        """
+        Wall time spanned by the recorded phases.
+        """
+        if not self.phases:
+            return 0.0
+        end = max(phase['start'] + phase['duration'] for phase in self.phases)
+        return end - min(phase['start'] for phase in self.phases)
+
+    def summary(self) -> str:
+        phases = ', '.join(
+            f'{phase["name"]} {phase["duration"]:.2f}s' for phase in self.phases
+        )
+        return f'{phases} (total {self.total:.2f}s)'
+
+    def save(self, path: pathlib.Path) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        report = dict(phases=self.phases, total=self.total)
+        path.write_text(json.dumps(report, indent=2), encoding='utf-8')
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> 'Timings':
+        with contextlib.suppress(OSError, ValueError):
+            return cls(json.loads(path.read_text(encoding='utf-8'))['phases'])
+        return cls()
+
+
+class SphinxPhases:
+    """
+    Track the read, resolve and write phases of a Sphinx build.
+
+    Resolution happens piecemeal during the write phase, so it's
+    accumulated separately and subtracted from the write time.
+    """
+
+    current: 'SphinxPhases | None' = None
+
+    def __init__(self):
+        self.timings = Timings()
+        self.resolving = 0.0
+        self.marks = {}
+
+    def mark(self, name):
+        self.marks[name] = (time.time(), time.perf_counter())
+
+    def between(self, name, begin, end, adjust=0.0):
+        if begin in self.marks and end in self.marks:
+            start, began = self.marks[begin]
+            duration = self.marks[end][1] - began - adjust
+            self.timings.record(name, start, duration)
+
+    def finish(self, path):
+        self.between('sphinx read', 'read', 'updated')
+        if 'updated' in self.marks:
+            start = self.marks['updated'][0]
+            self.timings.record('sphinx resolve', start, self.resolving)
+        self.between('sphinx write', 'updated', 'finished', adjust=self.resolving)
+        self.timings.save(pathlib.Path(path))
+
+
+def _timed_resolve(resolve):
+    @functools.wraps(resolve)
+    def wrapper(*args, **kwargs):
+        began = time.perf_counter()
+        try:
+            return resolve(*args, **kwargs)
+        finally:
+            if SphinxPhases.current:
+                SphinxPhases.current.resolving += time.perf_counter() - began
+
+    wrapper.timed = True
+    return wrapper
+
+
+def _on_builder_inited(app):
+    SphinxPhases.current = SphinxPhases()
+
+
+def _on_mark(name):
+    return lambda app, *args: SphinxPhases.current.mark(name)
+
+
+def _on_build_finished(app, exception):
+    SphinxPhases.current.mark('finished')
+    if app.config.coherent_docs_timings:
+        SphinxPhases.current.finish(app.config.coherent_docs_timings)
+
+
+def setup(app):
+    from sphinx.environment import BuildEnvironment
+
+    resolve = BuildEnvironment.get_and_resolve_doctree
+    if not getattr(resolve, 'timed', False):
+        BuildEnvironment.get_and_resolve_doctree = _timed_resolve(resolve)
+    app.add_config_value('coherent_docs_timings', '', '')
+    app.connect('builder-inited', _on_builder_inited)
+    app.connect('env-before-read-docs', _on_mark('read'))
+    app.connect('env-updated', _on_mark('updated'))
+    app.connect('build-finished', _on_build_finished)
+    return dict(parallel_read_safe=True, parallel_write_safe=True)
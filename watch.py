@@ -0,0 +1,66 @@
+"""
+Watch the project for changes relevant to the docs.
+"""
+
+import pathlib
+from collections.abc import Callable, Container, Iterator
+
+import watchfiles
+
+DEBOUNCE = 1600
+"""
+Milliseconds to wait for a burst of saves to settle before reporting.
+"""
+
+
+def relevant(
+    root: pathlib.Path,
+    excluded: Callable[[tuple[str, ...]], bool],
+    generated: Container[pathlib.Path] = (),
+):
+    """
+    Return a filter accepting changes to the docs (other than the
+    ``generated`` files, relative to root) or to Python sources outside
+    of excluded directories (given as their relative path's parts).
+
+    >>> generated = {pathlib.Path('docs/my.pkg.rst')}
+    >>> def hidden(parts):
+    ...     return any(name.startswith('.') for name in parts)
+    >>> accept = relevant(pathlib.Path('/p'), hidden, generated)
+    >>> accept(None, '/p/docs/history.rst')
+    True
+    >>> accept(None, '/p/docs/my.pkg.rst')
+    False
+    >>> accept(None, '/p/sub/mod.py')
+    True
+    >>> accept(None, '/p/.venv/mod.py')
+    False
+    >>> accept(None, '/p/build/html/index.html')
+    False
+    """
+
+    def accept(change, path: str) -> bool:
+        rel = pathlib.Path(path).relative_to(root)
+        if rel.parts[:1] == ('docs',):
+            return rel not in generated
+        return rel.suffix == '.py' and not excluded(rel.parts[:-1])
+
+    return accept
+
+
+def batches(
+    root: pathlib.Path,
+    excluded: Callable[[tuple[str, ...]], bool],
+    generated: Container[pathlib.Path] = (),
+    debounce: int = DEBOUNCE,
+) -> Iterator[set]:
+    """
+    Yield each batch of relevant changes under root, ignoring the
+    ``generated`` files (which may be added to while watching).
+
+    Uses inotify on Linux (and the native notification API elsewhere).
+    """
+    root = root.resolve()
+    yield from watchfiles.watch(
+        root, watch_filter=relevant(root, excluded, generated), debounce=debounce
+    )